@@ -0,0 +1,78 @@
+"""
+Usage: python -m benchmarks [--recipes N] [--output results.json] ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+
+def main() -> None:
+    """
+    Run benchmarks in a separate data directory and write results as json.
+    """
+    parser = argparse.ArgumentParser(description="Recipe service benchmarks.")
+    parser.add_argument("--recipes", type=int, default=10000, help="number of recipes")
+    parser.add_argument(
+        "--components", type=int, default=1000, help="number of distinct components"
+    )
+    parser.add_argument(
+        "--components-per-recipe",
+        type=int,
+        default=8,
+        help="number of components in every recipe",
+    )
+    parser.add_argument(
+        "--fridges", type=int, default=1000, help="number of distinct fridges"
+    )
+    parser.add_argument(
+        "--fridge-size", type=int, default=30, help="number of components in a fridge"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="number of requests to endpoint"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="number of concurrent clients"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of random generator")
+    parser.add_argument("--no-micro", action="store_true", help="skip micro-benchmarks")
+    parser.add_argument("--no-load", action="store_true", help="skip load of endpoints")
+    parser.add_argument(
+        "--data-path", help="directory for recipe book and db, temporary by default"
+    )
+    parser.add_argument("--output", help="file to write results to, stdout by default")
+    args = parser.parse_args()
+
+    # Paths of service are read from config on import, so they are redirected first
+    os.environ["RECIPE_SERVICE_DATA_PATH"] = args.data_path or tempfile.mkdtemp(
+        prefix="recipe_service_benchmarks_"
+    )
+
+    from benchmarks.suite import run_suite
+
+    results = asyncio.get_event_loop().run_until_complete(
+        run_suite(
+            args.recipes,
+            args.components,
+            args.components_per_recipe,
+            args.fridges,
+            args.fridge_size,
+            args.requests,
+            args.concurrency,
+            args.seed,
+            micro=not args.no_micro,
+            load=not args.no_load,
+        )
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+    else:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+import random
+
+from pathlib import Path
+
+
+def get_component_names(components: int) -> list:
+    """
+    Get names of synthetic components.
+
+    :param components: number of components.
+    :return: list of names.
+    """
+    return ["component {}".format(x) for x in range(components)]
+
+
+def get_component_weights(components: int) -> list:
+    """
+    Get Zipf-like popularity of components, so that some of them are common
+    in recipes and fridges and matching finds recipes.
+
+    :param components: number of components.
+    :return: list of weights in the order of names.
+    """
+    return [1 / (x + 1) for x in range(components)]
+
+
+def sample_components(rng: random.Random, components: int, size: int) -> list:
+    """
+    Choose distinct components according to their popularity.
+
+    :param rng: random generator.
+    :param components: number of components.
+    :param size: number of chosen components.
+    :return: list of names.
+    """
+    if size > components:
+        raise ValueError("Can't choose {} of {} components.".format(size, components))
+
+    names = get_component_names(components)
+    weights = get_component_weights(components)
+
+    chosen = {}
+    while len(chosen) < size:
+        for name in rng.choices(names, weights, k=size - len(chosen)):
+            chosen[name] = None
+
+    return list(chosen)[:size]
+
+
+def generate_recipes(
+    recipes: int, components: int, components_per_recipe: int, seed: int = 0
+):
+    """
+    Yield synthetic recipes in the format of data file.
+
+    :param recipes: number of recipes.
+    :param components: number of distinct components.
+    :param components_per_recipe: number of components in every recipe.
+    :param seed: seed of random generator.
+    :return: iterator of recipes.
+    """
+    rng = random.Random(seed)
+
+    for recipe_id in range(recipes):
+        yield {
+            "name": "recipe {}".format(recipe_id),
+            "components": [
+                {"item": x, "q": rng.randint(1, 1000)}
+                for x in sample_components(rng, components, components_per_recipe)
+            ],
+        }
+
+
+def write_recipe_book(
+    file_path: Path,
+    recipes: int,
+    components: int,
+    components_per_recipe: int,
+    seed: int = 0,
+) -> None:
+    """
+    Write synthetic recipe book to file recipe by recipe,
+    so that books bigger than memory can be generated.
+
+    :param file_path: path to file.
+    :param recipes: number of recipes.
+    :param components: number of distinct components.
+    :param components_per_recipe: number of components in every recipe.
+    :param seed: seed of random generator.
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with file_path.open("w", encoding="UTF-8") as f:
+        f.write('{"recipes": [\n')
+
+        for recipe_id, recipe in enumerate(
+            generate_recipes(recipes, components, components_per_recipe, seed)
+        ):
+            if recipe_id:
+                f.write(",\n")
+            f.write(json.dumps(recipe, ensure_ascii=False))
+
+        f.write("\n]}\n")
+
+
+def generate_fridges(
+    fridges: int, components: int, fridge_size: int, seed: int = 0
+) -> list:
+    """
+    Generate synthetic fridges with components of the same popularity as in recipes.
+
+    :param fridges: number of fridges.
+    :param components: number of distinct components.
+    :param fridge_size: number of components in every fridge.
+    :param seed: seed of random generator.
+    :return: list of dicts of components and their quantity.
+    """
+    rng = random.Random(seed)
+
+    return [
+        {
+            x: rng.randint(1, 10000)
+            for x in sample_components(rng, components, fridge_size)
+        }
+        for _ in range(fridges)
+    ]
@@ -0,0 +1,117 @@
+import asyncio
+
+from collections import Counter
+from itertools import count
+from time import perf_counter
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.codec import dumps
+from benchmarks.timing import summarize
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def get_scenarios(fridges: list, batch_size: int = 10) -> dict:
+    """
+    Get requests to every endpoint, one list of requests per endpoint.
+
+    :param fridges: list of dicts of components and their quantity.
+    :param batch_size: number of fridges in a batch request.
+    :return: dict of names of scenarios and lists of (method, path, kwargs).
+    """
+    return {
+        "POST /recipes/possible": [
+            ("POST", "/recipes/possible", {"data": dumps(x), "headers": JSON_HEADERS})
+            for x in fridges
+        ],
+        "POST /recipes/possible?stream=1": [
+            (
+                "POST",
+                "/recipes/possible?stream=1",
+                {"data": dumps(x), "headers": JSON_HEADERS},
+            )
+            for x in fridges
+        ],
+        "POST /recipes/possible/batch": [
+            (
+                "POST",
+                "/recipes/possible/batch",
+                {"data": dumps(fridges[i : i + batch_size]), "headers": JSON_HEADERS},
+            )
+            for i in range(0, len(fridges), batch_size)
+        ],
+        "GET /recipes/last": [("GET", "/recipes/last", {})],
+        "GET /components/popular": [("GET", "/components/popular", {})],
+    }
+
+
+async def run_load(
+    client: TestClient, requests: list, total: int, concurrency: int
+) -> dict:
+    """
+    Send requests from a number of concurrent clients, cycling over requests
+    until total of them are sent, and time every one of them.
+
+    :param client: client of the tested server.
+    :param requests: list of (method, path, kwargs of request).
+    :param total: number of requests to send.
+    :param concurrency: number of concurrent clients.
+    :return: summary of latencies with throughput and statuses.
+    """
+    numbers = count()
+    timings = []
+    statuses = Counter()
+
+    async def send():
+        while True:
+            number = next(numbers)
+            if number >= total:
+                return
+
+            method, path, kwargs = requests[number % len(requests)]
+
+            started = perf_counter()
+            async with client.request(method, path, **kwargs) as response:
+                await response.read()
+            timings.append(perf_counter() - started)
+
+            statuses[response.status] += 1
+
+    started = perf_counter()
+    await asyncio.gather(*[send() for _ in range(concurrency)])
+    duration = perf_counter() - started
+
+    result = summarize(timings)
+    result.update(
+        {
+            "duration_s": duration,
+            "requests_per_s": total / duration,
+            "errors": sum(v for k, v in statuses.items() if k >= 400),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        }
+    )
+
+    return result
+
+
+async def bench_load(
+    app: web.Application, fridges: list, total: int, concurrency: int
+) -> dict:
+    """
+    Start app in process and load every endpoint in turn.
+
+    :param app: aiohttp application.
+    :param fridges: list of dicts of components and their quantity.
+    :param total: number of requests to every endpoint.
+    :param concurrency: number of concurrent clients.
+    :return: dict of names of scenarios and their results.
+    """
+    results = {}
+
+    async with TestClient(TestServer(app)) as client:
+        for name, requests in get_scenarios(fridges).items():
+            results[name] = await run_load(client, requests, total, concurrency)
+
+    return results
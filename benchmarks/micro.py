@@ -0,0 +1,53 @@
+from src.codec import dumps
+from src.db import db_fill
+from src.recipes import (
+    process_payload,
+    get_recipes_from_components,
+    get_most_popular_components,
+)
+from benchmarks.timing import measure, measure_async
+
+
+def bench_db_fill(runs: int = 1) -> dict:
+    """
+    Time recreation of db from data file.
+
+    :param runs: number of recreations.
+    :return: summary of timings.
+    """
+    return measure(lambda _: db_fill(force_recreate=True), range(runs))
+
+
+async def bench_process_payload(fridges: list) -> dict:
+    """
+    Time decoding and validation of request payloads.
+
+    :param fridges: list of dicts of components and their quantity.
+    :return: summary of timings.
+    """
+    return await measure_async(process_payload, [dumps(x) for x in fridges])
+
+
+async def bench_get_recipes_from_components(fridges: list) -> dict:
+    """
+    Time matching of fridges with cold and warm result cache,
+    including writes of statistics.
+
+    :param fridges: list of dicts of components and their quantity.
+    :return: summaries of timings of the first and the second pass.
+    """
+    return {
+        "cold": await measure_async(get_recipes_from_components, fridges),
+        "cached": await measure_async(get_recipes_from_components, fridges),
+    }
+
+
+async def bench_get_most_popular_components(runs: int, limit: int = 10) -> dict:
+    """
+    Time selection of the most popular components.
+
+    :param runs: number of calls.
+    :param limit: number of components to select.
+    :return: summary of timings.
+    """
+    return await measure_async(get_most_popular_components, [limit] * runs)
@@ -0,0 +1,100 @@
+import platform
+
+from datetime import datetime, timezone
+
+from src.codec import CODEC
+from src.db import db_fill, open_pool, close_pool
+from src.main import create_app
+from benchmarks.generator import write_recipe_book, generate_fridges
+from benchmarks.micro import (
+    bench_db_fill,
+    bench_process_payload,
+    bench_get_recipes_from_components,
+    bench_get_most_popular_components,
+)
+from benchmarks.load import bench_load
+from data.config import (
+    FILE_PATH,
+    MATCHING_ENGINE,
+    MATCHING_EXECUTOR_WORKERS,
+    RESULT_CACHE_SIZE,
+    STATS_WRITE_BEHIND,
+)
+
+
+def get_environment() -> dict:
+    """
+    Describe environment and configuration that results depend on.
+
+    :return: dict of their names and values.
+    """
+    return {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "codec": CODEC,
+        "matching_engine": MATCHING_ENGINE,
+        "matching_executor_workers": MATCHING_EXECUTOR_WORKERS,
+        "result_cache_size": RESULT_CACHE_SIZE,
+        "stats_write_behind": STATS_WRITE_BEHIND,
+    }
+
+
+async def run_suite(
+    recipes: int = 10000,
+    components: int = 1000,
+    components_per_recipe: int = 8,
+    fridges: int = 1000,
+    fridge_size: int = 30,
+    requests: int = 2000,
+    concurrency: int = 32,
+    seed: int = 0,
+    micro: bool = True,
+    load: bool = True,
+) -> dict:
+    """
+    Generate recipe book, fill db with it and run benchmarks against it.
+
+    :param recipes: number of recipes.
+    :param components: number of distinct components.
+    :param components_per_recipe: number of components in every recipe.
+    :param fridges: number of distinct fridges.
+    :param fridge_size: number of components in every fridge.
+    :param requests: number of requests to every endpoint.
+    :param concurrency: number of concurrent clients.
+    :param seed: seed of random generator.
+    :param micro: run micro-benchmarks.
+    :param load: run load of endpoints.
+    :return: parameters, environment and results of benchmarks.
+    """
+    parameters = dict(locals())
+
+    write_recipe_book(FILE_PATH, recipes, components, components_per_recipe, seed)
+    fridge_list = generate_fridges(fridges, components, fridge_size, seed)
+
+    results = {"parameters": parameters, "environment": get_environment()}
+
+    if micro:
+        results["micro"] = micro_results = {"db_fill": bench_db_fill()}
+
+        await open_pool()
+        try:
+            micro_results["process_payload"] = await bench_process_payload(fridge_list)
+            micro_results["get_recipes_from_components"] = (
+                await bench_get_recipes_from_components(fridge_list)
+            )
+            micro_results["get_most_popular_components"] = (
+                await bench_get_most_popular_components(fridges)
+            )
+        finally:
+            await close_pool()
+
+    if load:
+        # Statistics of micro-benchmarks don't matter, book is the same
+        db_fill(force_recreate=True)
+
+        results["load"] = await bench_load(
+            create_app(prepare_db=False), fridge_list, requests, concurrency
+        )
+
+    return results
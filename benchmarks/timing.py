@@ -0,0 +1,76 @@
+import math
+
+from time import perf_counter
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """
+    Get percentile of values by the nearest rank method.
+
+    :param sorted_values: values in ascending order.
+    :param fraction: percentile as a fraction, e.g. 0.95.
+    :return: value of the percentile.
+    """
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(timings: list) -> dict:
+    """
+    Summarize durations of runs.
+
+    :param timings: durations of runs in seconds.
+    :return: dict with number of runs and statistics in milliseconds.
+    """
+    timings = sorted(timings)
+
+    if not timings:
+        return {"runs": 0}
+
+    return {
+        "runs": len(timings),
+        "total_ms": sum(timings) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "max_ms": timings[-1] * 1000,
+    }
+
+
+def measure(function, arguments: list) -> dict:
+    """
+    Call function with every item of arguments and time each call.
+
+    :param function: function of one argument.
+    :param arguments: list of arguments.
+    :return: summary of timings.
+    """
+    timings = []
+
+    for argument in arguments:
+        started = perf_counter()
+        function(argument)
+        timings.append(perf_counter() - started)
+
+    return summarize(timings)
+
+
+async def measure_async(function, arguments: list) -> dict:
+    """
+    Await coroutine function with every item of arguments and time each call.
+
+    :param function: coroutine function of one argument.
+    :param arguments: list of arguments.
+    :return: summary of timings.
+    """
+    timings = []
+
+    for argument in arguments:
+        started = perf_counter()
+        await function(argument)
+        timings.append(perf_counter() - started)
+
+    return summarize(timings)
@@ -1,16 +1,96 @@
+import os
+
 from pathlib import Path
-from logging import ERROR, INFO, DEBUG
+from logging import ERROR, INFO, DEBUG, getLevelName
 
-DATA_PATH = Path().cwd() / "data"
-DATA_PATH.mkdir(parents=True, exist_ok=True)
+# Directories are created when db or log file is written, not on import
+DATA_PATH = Path(os.environ.get("RECIPE_SERVICE_DATA_PATH", Path().cwd() / "data"))
 
 FILE_PATH = DATA_PATH / "task.json"
 DB_PATH = DATA_PATH / "database.db"
 
-OVERALL_LOG_LEVEL = DEBUG
+DB_POOL_READERS = 4
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # in KiB
+    "PRAGMA mmap_size=268435456",  # in bytes
+    "PRAGMA busy_timeout=5000",  # in milliseconds
+)
+# Used only while db is created, a failed import leaves it unusable
+DB_BULK_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # in KiB
+)
+DB_FILL_BATCH_SIZE = 10000  # number of recipes inserted at once
+DB_FILL_PROGRESS_INTERVAL = 5.0  # in seconds
+LOADER_CHUNK_SIZE = 2 ** 20  # number of characters of recipe file read at once
+# Skip migration of an up-to-date db on startup, overridden in environment
+FAST_START = bool(os.environ.get("RECIPE_SERVICE_FAST_START"))
+# Map recipe index from a snapshot next to db, so that processes share its pages
+RECIPE_INDEX_SNAPSHOT = FAST_START
+
+# "python" for inverted index, "numpy" for recipe matrix or "sql" for query to db
+MATCHING_ENGINE = "python"
+MATRIX_CHUNK_SIZE = 2 ** 24  # max number of fridge x matrix entries computed at once
+
+MATCHING_EXECUTOR_WORKERS = 0  # processes matching big fridges, 0 matches inline
+MATCHING_EXECUTOR_THRESHOLD = 100000  # index entries visited to offload matching
+
+RESULT_CACHE_SIZE = 100000  # max number of recipes in all cached results, 0 disables
+RESULT_CACHE_TTL = 300  # in seconds
+
+PARTIAL_MATCH_MAX_LIMIT = 1000  # max number of recipes returned by partial matching
+
+STREAM_CHUNK_SIZE = 1000  # number of recipes written at once in streaming responses
+
+STATS_WRITE_BEHIND = False  # buffer statistics in memory and flush them in background
+STATS_FLUSH_INTERVAL = 1.0  # in seconds
+STATS_FLUSH_SIZE = 10000  # number of buffered components and recipes
+
+RECIPE_BOOK_WATCH = False  # reload recipe book from file when the file changes
+# Token expected in X-Admin-Token header of admin endpoints, they are off if unset
+ADMIN_TOKEN = os.environ.get("RECIPE_SERVICE_ADMIN_TOKEN")
+RECIPE_BOOK_CHECK_INTERVAL = 5.0  # in seconds
+
+# Upper bounds of buckets of latency histograms, in seconds
+METRICS_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+WORKERS_CHECK_INTERVAL = 1.0  # in seconds
+WORKERS_SHUTDOWN_TIMEOUT = 30.0  # in seconds
+
+
+def get_log_level(variable: str, default: str = "DEBUG") -> int:
+    """
+    Get log level from environment variable with its name, like "INFO".
+    Raises ValueError for unknown names.
+
+    :param variable: name of environment variable.
+    :param default: name of level used if variable is not set.
+    :return: log level.
+    """
+    name = os.environ.get(variable, default).upper()
+    level = getLevelName(name)
+
+    # Unknown names are returned as "Level <name>" strings
+    if not isinstance(level, int):
+        raise ValueError(
+            "{} must be a log level name like DEBUG or INFO, not {!r}.".format(
+                variable, name
+            )
+        )
+
+    return level
+
+
+# Levels are names like "INFO", overridden in environment
+OVERALL_LOG_LEVEL = get_log_level("RECIPE_SERVICE_OVERALL_LOG_LEVEL")
 
 LOGGER_NAME = "recipe_service"
-LOGGER_LEVEL = DEBUG
+LOGGER_LEVEL = get_log_level("RECIPE_SERVICE_LOG_LEVEL")
+LOGGER_FILE_HANDLER = bool(os.environ.get("RECIPE_SERVICE_LOG_FILE"))  # log to file
 LOGGER_FORMAT = "%(asctime)s - %(levelname)-5s - %(message)s"  # %(filename)-11s:%(lineno)3d
 LOG_PATH = DATA_PATH / "logs" / "log.log"
-LOG_PATH.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+
+from collections import OrderedDict
+from time import monotonic
+
+from data.config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+
+
+def get_fridge_key(fridge_components: dict, options: tuple = ()) -> bytes:
+    """
+    Get key of fridge that does not depend on the order of its components.
+
+    :param fridge_components: dict of components and their quantity.
+    :param options: options of matching that change the result.
+    :return: digest of canonicalized fridge.
+    """
+    canonical = json.dumps(fridge_components, sort_keys=True, ensure_ascii=False)
+
+    if options:
+        canonical += json.dumps(options)
+
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    LRU cache of matching results with time to live.
+
+    Size is counted in recipes, so that memory is bounded
+    no matter how many recipes each result contains.
+    """
+
+    def __init__(self, size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        """
+        :param size: max number of recipes in all cached results, 0 disables cache.
+        :param ttl: seconds a result stays valid.
+        """
+        self.size = size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (expiration time, result)
+        self._used = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _weight(result: list) -> int:
+        return len(result) + 1
+
+    def get(self, fridge_components: dict, options: tuple = ()):
+        """
+        Get cached result of fridge.
+
+        :param fridge_components: dict of components and their quantity.
+        :param options: options of matching that change the result.
+        :return: list of recipes or None if it is not cached.
+        """
+        key = get_fridge_key(fridge_components, options)
+        entry = self._entries.get(key)
+
+        if entry is not None and entry[0] < monotonic():
+            self._pop(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+
+        return entry[1]
+
+    def put(self, fridge_components: dict, result: list, options: tuple = ()) -> None:
+        """
+        Cache result of fridge, evicting least recently used results if needed.
+
+        :param fridge_components: dict of components and their quantity.
+        :param result: list of recipes.
+        :param options: options of matching that change the result.
+        """
+        weight = self._weight(result)
+        if weight > self.size:
+            return
+
+        key = get_fridge_key(fridge_components, options)
+        self._pop(key)
+
+        while self._used + weight > self.size:
+            self._pop(next(iter(self._entries)))
+
+        self._entries[key] = (monotonic() + self.ttl, result)
+        self._used += weight
+
+    def _pop(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._used -= self._weight(entry[1])
+
+    def clear(self) -> None:
+        """
+        Remove all cached results.
+        """
+        self._entries.clear()
+        self._used = 0
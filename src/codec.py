@@ -0,0 +1,67 @@
+"""
+https://github.com/ijl/orjson
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# orjson.JSONDecodeError is a subclass of it, so it catches errors of both codecs
+JSONDecodeError = json.JSONDecodeError
+
+if orjson is not None:
+    CODEC = "orjson"
+
+    # Separator of array items, so that arrays can be written item by item
+    ITEM_SEPARATOR = b","
+
+    def loads(data):
+        """
+        Decode json from bytes or str.
+
+        :param data: json document.
+        :return: decoded object.
+        """
+        return orjson.loads(data)
+
+    def dumps(obj) -> bytes:
+        """
+        Encode object to UTF-8 json.
+
+        :param obj: object to encode.
+        :return: json document.
+        """
+        return orjson.dumps(obj)
+
+
+else:  # pragma: no cover
+    CODEC = "json"
+
+    ITEM_SEPARATOR = b", "
+
+    def loads(data):
+        """
+        Decode json from bytes or str.
+
+        :param data: json document.
+        :return: decoded object.
+        """
+        if isinstance(data, bytes):
+            try:
+                data = data.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise JSONDecodeError(str(e), "", 0)
+
+        return json.loads(data)
+
+    def dumps(obj) -> bytes:
+        """
+        Encode object to UTF-8 json.
+
+        :param obj: object to encode.
+        :return: json document.
+        """
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
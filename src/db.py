@@ -1,18 +1,143 @@
 """
 https://github.com/omnilib/aiosqlite
 """
+import argparse
+import asyncio
 import aiosqlite
 import sqlite3
 import json
+import math
+import os
+import secrets
 
-from aiohttp_cache import cache
+from contextlib import asynccontextmanager
+from logging import DEBUG
 from pathlib import Path
+from time import monotonic
 
+from src.index import rebuild_recipe_index, drop_recipe_index
+from src.loader import iter_recipes, iter_batches
+from src.snapshot import remove_snapshot
+from src.metrics import time_query
 from src.log import logger
-from data.config import DB_PATH, FILE_PATH
+from data.config import (
+    DB_PATH,
+    FILE_PATH,
+    DB_POOL_READERS,
+    DB_PRAGMAS,
+    DB_BULK_PRAGMAS,
+    DB_FILL_BATCH_SIZE,
+    DB_FILL_PROGRESS_INTERVAL,
+)
+
+# Version of db schema, stored as PRAGMA user_version
+SCHEMA_VERSION = 3
+
+
+class ConnectionPool:
+    """
+    Pool of persistent connections to a database:
+    one shared writer connection and a number of reader connections.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, readers: int = DB_POOL_READERS) -> None:
+        """
+        :param db_path: path to database.
+        :param readers: number of reader connections.
+        """
+        self.db_path = db_path
+        self.readers = readers
+
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+
+    async def _connect(self, *pragmas: str) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.db_path)
+
+        for pragma in DB_PRAGMAS + pragmas:
+            await db.execute(pragma)
+
+        return db
+
+    async def open(self) -> None:
+        """
+        Open writer and reader connections.
+        """
+        self._writer = await self._connect()
+
+        for _ in range(self.readers):
+            self._readers.put_nowait(await self._connect("PRAGMA query_only=ON"))
+
+    async def close(self) -> None:
+        """
+        Close all connections, waiting for the borrowed ones to be returned.
+        """
+        async with self._writer_lock:
+            await self._writer.close()
+
+        for _ in range(self.readers):
+            db = await self._readers.get()
+            await db.close()
+
+    @asynccontextmanager
+    async def writer(self) -> aiosqlite.Connection:
+        """
+        Borrow writer connection. Only one coroutine can hold it at a time.
+        """
+        async with self._writer_lock:
+            yield self._writer
+
+    @asynccontextmanager
+    async def reader(self) -> aiosqlite.Connection:
+        """
+        Borrow one of reader connections.
+        """
+        db = await self._readers.get()
+
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+
+_pools = {}
+
+
+async def open_pool(
+    db_path: Path = DB_PATH, readers: int = DB_POOL_READERS
+) -> ConnectionPool:
+    """
+    Open connection pool to the database. Queries to it will go through the pool.
+
+    :param db_path: path to database.
+    :param readers: number of reader connections.
+    :return: connection pool.
+    """
+    pool = ConnectionPool(db_path, readers)
+    await pool.open()
+
+    _pools[db_path] = pool
+
+    logger.debug("Opened connection pool with %s readers.", readers)
+
+    return pool
+
+
+async def close_pool(db_path: Path = DB_PATH) -> None:
+    """
+    Close connection pool to the database if it is open.
+
+    :param db_path: path to database.
+    """
+    pool = _pools.pop(db_path, None)
+
+    if pool is not None:
+        await pool.close()
+
+        logger.debug("Closed connection pool.")
 
 
-@cache()
 async def get_db(db_path: Path = DB_PATH) -> aiosqlite.Connection:
     """
     Get aiosqlite connection proxy.
@@ -23,6 +148,28 @@ async def get_db(db_path: Path = DB_PATH) -> aiosqlite.Connection:
     return aiosqlite.connect(db_path)
 
 
+@asynccontextmanager
+async def connection(db_path: Path = DB_PATH, write: bool = False):
+    """
+    Borrow connection from the pool of the database,
+    or open a one-off connection if there is no pool.
+
+    :param db_path: path to database.
+    :param write: connection is used for writing.
+    """
+    pool = _pools.get(db_path)
+
+    if pool is None:
+        async with await get_db(db_path) as db:
+            yield db
+    elif write:
+        async with pool.writer() as db:
+            yield db
+    else:
+        async with pool.reader() as db:
+            yield db
+
+
 async def execute_query(
     query: str, parameters: tuple = (), db_path: Path = DB_PATH
 ) -> None:
@@ -34,13 +181,43 @@ async def execute_query(
     :param db_path: path to database.
     :return: query results.
     """
-    logger.debug(
-        "Executing query: '{}' with parameters: '{}'".format(query, parameters)
-    )
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("Executing query: '%s' with parameters: '%s'", query, parameters)
+
+    async with connection(db_path, write=True) as db:
+        try:
+            with time_query(query):
+                await db.execute(query, parameters)
+                await db.commit()
+        except BaseException:
+            # Also on cancellation, so that the next user of a pooled writer
+            # doesn't commit what is left
+            await db.rollback()
+            raise
+
+
+async def execute_transaction(queries: list, db_path: Path = DB_PATH) -> None:
+    """
+    Execute queries with executemany in a single transaction and commit it once.
+
+    :param queries: list of (query, list of parameters) pairs.
+    :param db_path: path to database.
+    """
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("Executing transaction: '%s'", queries)
 
-    async with await get_db(db_path) as db:
-        await db.execute(query, parameters)
-        await db.commit()
+    async with connection(db_path, write=True) as db:
+        try:
+            for query, parameters in queries:
+                with time_query(query):
+                    await db.executemany(query, parameters)
+
+            await db.commit()
+        except BaseException:
+            # Also on cancellation, so that half of the transaction is not
+            # committed by the next user of a pooled writer
+            await db.rollback()
+            raise
 
 
 async def get_query_results(
@@ -54,13 +231,54 @@ async def get_query_results(
     :param db_path: path to database.
     :return: query results.
     """
-    logger.debug(
-        "Executing query: '{}' with parameters: '{}'".format(query, parameters)
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("Executing query: '%s' with parameters: '%s'", query, parameters)
+
+    async with connection(db_path) as db:
+        with time_query(query):
+            async with await db.execute(query, parameters) as cursor:
+                return await cursor.fetchall()
+
+
+async def get_possible_recipes(
+    fridge_components: dict,
+    db_path: Path = DB_PATH,
+    floor: bool = False,
+    min_quantity: float = 0,
+) -> list:
+    """
+    Return recipes that can be cooked from fridge components, computed by SQLite:
+    a recipe is possible if all its components are joined with the fridge.
+
+    :param fridge_components: dict of components and their quantity.
+    :param db_path: path to database.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :return: list of recipes in db order.
+    """
+    # Whole portions reach min_quantity only if quantity reaches its ceiling
+    threshold = math.ceil(min_quantity) if floor else min_quantity
+
+    recipes = await get_query_results(
+        "SELECT recipe_name, MIN(CAST(fridge.value AS REAL) / q) AS quantity "
+        "FROM json_each(?) AS fridge "
+        "JOIN components ON component = fridge.key "
+        "JOIN recipe_components USING (component_id) "
+        "JOIN recipes USING (recipe_id) "
+        "GROUP BY recipe_id "
+        "HAVING COUNT(*) = component_count AND quantity >= ? "
+        "ORDER BY recipe_id",
+        (json.dumps(fridge_components, ensure_ascii=False), threshold),
+        db_path=db_path,
     )
 
-    async with await get_db(db_path) as db:
-        async with await db.execute(query, parameters) as cursor:
-            return await cursor.fetchall()
+    if floor:
+        return [
+            {"name": name, "quantity": math.floor(quantity)}
+            for name, quantity in recipes
+        ]
+
+    return [{"name": name, "quantity": quantity} for name, quantity in recipes]
 
 
 def db_fill(
@@ -75,63 +293,406 @@ def db_fill(
     :param force_recreate: force recreate database.
     :return: True if db was created, False if it already exists.
     """
-
-    def get_recipes():
-        with file_path.open(encoding="UTF-8") as f:
-            return json.load(f)["recipes"]
-
     if force_recreate:
-        db_remove()
+        db_remove(db_path)
     elif db_path.is_file():
         return False
 
+    # Snapshot of a removed db could have the same book version as the new one
+    remove_snapshot(db_path)
+
+    db_create(file_path, db_path)
+
+    rebuild_recipe_index(db_path)
+
+    return True
+
+
+def db_create(file_path: Path = FILE_PATH, db_path: Path = DB_PATH) -> None:
+    """
+    Create a new database file with recipes from text file.
+    Recipes are read from file one by one and inserted in batches,
+    so that big files are not loaded into memory. If import fails, the file is removed.
+
+    :param file_path: path to file with data.
+    :param db_path: path to database.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
     db_path.touch()
 
-    with sqlite3.connect(db_path) as db:
+    try:
+        with sqlite3.connect(db_path) as db:
+            cursor = db.cursor()
+
+            for pragma in DB_BULK_PRAGMAS:
+                cursor.execute(pragma)
+
+            db_create_tables(cursor)
+            db_import_recipes(cursor, iter_recipes(file_path))
+
+            # Indexes are built once over all rows instead of updated on every insert
+            db_create_indexes(cursor)
+
+            db.commit()
+    except BaseException:
+        db_remove(db_path)
+        raise
+
+
+def db_swap(db_path: Path, shadow_path: Path) -> None:
+    """
+    Replace recipe book in db with the one from shadow db in one transaction,
+    keeping statistics of recipes and components that are in both.
+    Readers see either the old book or the new one.
+
+    :param db_path: path to database.
+    :param shadow_path: path to database with the new recipe book.
+    """
+    with sqlite3.connect(db_path, isolation_level=None) as db:
         cursor = db.cursor()
+        cursor.execute("ATTACH DATABASE ? AS shadow", (str(shadow_path),))
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute("DROP INDEX IF EXISTS recipes_last_recommended")
+        cursor.execute("DROP INDEX IF EXISTS components_total_encountered")
+        cursor.execute("DROP INDEX IF EXISTS recipe_components_component")
+        cursor.execute("ALTER TABLE recipe_components RENAME TO recipe_components_old")
+        cursor.execute("ALTER TABLE recipes RENAME TO recipes_old")
+        cursor.execute("ALTER TABLE components RENAME TO components_old")
 
+        db_create_tables(cursor)
+
+        cursor.execute(
+            "INSERT INTO recipes "
+            "(recipe_id, recipe_name, component_count, last_recommended) "
+            "SELECT new.recipe_id, new.recipe_name, new.component_count, "
+            "COALESCE(old.last_recommended, 0) FROM shadow.recipes AS new "
+            "LEFT JOIN recipes_old AS old ON old.recipe_name = new.recipe_name "
+            "ORDER BY new.recipe_id"
+        )
         cursor.execute(
-            "CREATE TABLE IF NOT EXISTS recipes "
-            "(recipe_name TEXT PRIMARY KEY,"  # name of the recipe
-            " components TEXT NOT NULL,"  # json of ingredients
-            " last_recommended INTEGER DEFAULT 0)"  # unix time of the last usage in recommendation
+            "INSERT INTO components (component_id, component, total_encountered) "
+            "SELECT new.component_id, new.component, "
+            "COALESCE(old.total_encountered, 0) FROM shadow.components AS new "
+            "LEFT JOIN components_old AS old ON old.component = new.component "
+            "ORDER BY new.component_id"
         )
         cursor.execute(
-            "CREATE TABLE IF NOT EXISTS components "
-            "(component TEXT PRIMARY KEY,"  # name of ingredient
-            " total_encountered)"  # number of times it appeared in fridges
+            "INSERT INTO recipe_components (recipe_id, component_id, q) "
+            "SELECT recipe_id, component_id, q FROM shadow.recipe_components"
         )
 
-        unique_components = set()
-        for recipe in get_recipes():
-            for component in recipe["components"]:
-                unique_components.add(component["item"])
+        cursor.execute("DROP TABLE recipe_components_old")
+        cursor.execute("DROP TABLE recipes_old")
+        cursor.execute("DROP TABLE components_old")
 
-            cursor.execute(
-                "INSERT INTO recipes (recipe_name, components) VALUES (?,?)",
-                (recipe["name"], json.dumps(recipe["components"], ensure_ascii=False)),
+        db_create_indexes(cursor)
+
+        cursor.execute("COMMIT")
+        cursor.execute("DETACH DATABASE shadow")
+
+
+def get_shadow_path(db_path: Path = DB_PATH) -> Path:
+    """
+    Get path of the shadow db that a new recipe book is imported into.
+
+    :param db_path: path to database.
+    :return: path to shadow database of this process.
+    """
+    return db_path.with_name("{}.{}.shadow".format(db_path.name, os.getpid()))
+
+
+def db_reload(file_path: Path = FILE_PATH, db_path: Path = DB_PATH) -> None:
+    """
+    Replace recipe book in db with the one from text file, keeping statistics.
+    Recipes are imported into a shadow db first, so db is locked only for the swap.
+
+    :param file_path: path to file with data.
+    :param db_path: path to database.
+    """
+    shadow_path = get_shadow_path(db_path)
+
+    try:
+        db_create(file_path, shadow_path)
+        db_swap(db_path, shadow_path)
+    finally:
+        db_remove(shadow_path)
+
+    logger.info("Reloaded recipe book from %s.", file_path)
+
+
+def get_recipe_requirements(components: list) -> dict:
+    """
+    Get quantity of every distinct item of a recipe. An item listed several times
+    needs the largest of its quantities, as the scarcest entry limits the recipe.
+
+    :param components: list of dicts of item and its quantity.
+    :return: dict of items and their quantity in the order of the recipe.
+    """
+    requirements = {}
+
+    for component in components:
+        item = component["item"]
+
+        if item not in requirements or component["q"] > requirements[item]:
+            requirements[item] = component["q"]
+
+    return requirements
+
+
+def db_import_recipes(
+    cursor: sqlite3.Cursor, recipes, batch_size: int = DB_FILL_BATCH_SIZE
+) -> int:
+    """
+    Insert recipes into empty tables in batches, reporting progress.
+
+    :param cursor: cursor of db connection.
+    :param recipes: iterable of recipes as in data file.
+    :param batch_size: number of recipes inserted at once.
+    :return: number of inserted rows.
+    """
+    component_ids = {}
+    recipe_count = 0
+    row_count = 0
+
+    started = reported = monotonic()
+
+    for batch in iter_batches(recipes, batch_size):
+        recipe_rows = []
+        component_rows = []
+        recipe_component_rows = []
+
+        for recipe in batch:
+            requirements = get_recipe_requirements(recipe["components"])
+
+            recipe_count += 1
+            recipe_rows.append((recipe_count, recipe["name"], len(requirements)))
+
+            for item, needed_quantity in requirements.items():
+                component_id = component_ids.get(item)
+
+                if component_id is None:
+                    component_id = component_ids[item] = len(component_ids) + 1
+                    component_rows.append((component_id, item))
+
+                recipe_component_rows.append(
+                    (recipe_count, component_id, needed_quantity)
+                )
+
+        cursor.executemany(
+            "INSERT INTO recipes (recipe_id, recipe_name, component_count) "
+            "VALUES (?,?,?)",
+            recipe_rows,
+        )
+        cursor.executemany(
+            "INSERT INTO components (component_id, component) VALUES (?,?)",
+            component_rows,
+        )
+        cursor.executemany(
+            "INSERT INTO recipe_components (recipe_id, component_id, q) "
+            "VALUES (?,?,?)",
+            recipe_component_rows,
+        )
+        row_count += len(recipe_rows) + len(component_rows) + len(recipe_component_rows)
+
+        if monotonic() - reported >= DB_FILL_PROGRESS_INTERVAL:
+            reported = monotonic()
+            logger.info(
+                "Imported %s recipes, %s rows (%.0f rows/s).",
+                recipe_count,
+                row_count,
+                row_count / (reported - started),
             )
 
-        for component in unique_components:
+    elapsed = monotonic() - started
+    logger.info(
+        "Imported %s recipes, %s rows in %.2f s (%.0f rows/s).",
+        recipe_count,
+        row_count,
+        elapsed,
+        row_count / elapsed if elapsed else 0,
+    )
+
+    return row_count
+
+
+def db_create_tables(cursor: sqlite3.Cursor) -> None:
+    """
+    Create tables of current schema version.
+
+    :param cursor: cursor of db connection.
+    """
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS recipes "
+        "(recipe_id INTEGER PRIMARY KEY,"
+        " recipe_name TEXT NOT NULL UNIQUE,"  # name of the recipe
+        " component_count INTEGER NOT NULL,"  # number of ingredients
+        " last_recommended INTEGER DEFAULT 0)"  # unix time of the last usage in recommendation
+    )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS components "
+        "(component_id INTEGER PRIMARY KEY,"
+        " component TEXT NOT NULL UNIQUE,"  # name of ingredient
+        " total_encountered INTEGER DEFAULT 0)"  # number of times it appeared in fridges
+    )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS recipe_components "
+        "(recipe_id INTEGER NOT NULL REFERENCES recipes,"
+        " component_id INTEGER NOT NULL REFERENCES components,"
+        " q NUMERIC NOT NULL,"  # quantity of ingredient needed by recipe
+        " PRIMARY KEY (recipe_id, component_id)) WITHOUT ROWID"
+    )
+
+    # Tables are created for every new recipe book
+    db_new_book(cursor)
+
+    cursor.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+
+def db_new_book(cursor: sqlite3.Cursor) -> None:
+    """
+    Give the recipe book in db a new random generation id, so that indexes
+    and snapshots of another book are told apart even from a db created anew.
+
+    :param cursor: cursor of db connection.
+    """
+    cursor.execute("CREATE TABLE IF NOT EXISTS book (generation INTEGER NOT NULL)")
+    cursor.execute("DELETE FROM book")
+    cursor.execute("INSERT INTO book (generation) VALUES (?)", (secrets.randbits(63),))
+
+
+def db_create_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    Create indexes that are missing from db.
+
+    :param cursor: cursor of db connection.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS recipes_last_recommended "
+        "ON recipes (last_recommended)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS components_total_encountered "
+        "ON components (total_encountered, component)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS recipe_components_component "
+        "ON recipe_components (component_id, recipe_id, q)"
+    )
+
+
+def db_migrate_v1(cursor: sqlite3.Cursor) -> None:
+    """
+    Move recipes with components stored as json text to normalized tables,
+    keeping statistics.
+
+    :param cursor: cursor of db connection.
+    """
+    cursor.execute("DROP INDEX IF EXISTS recipes_last_recommended")
+    cursor.execute("DROP INDEX IF EXISTS components_total_encountered")
+    cursor.execute("ALTER TABLE recipes RENAME TO recipes_v1")
+    cursor.execute("ALTER TABLE components RENAME TO components_v1")
+
+    db_create_tables(cursor)
+
+    cursor.execute(
+        "INSERT INTO components (component, total_encountered) "
+        "SELECT component, COALESCE(total_encountered, 0) FROM components_v1 "
+        "ORDER BY rowid"
+    )
+
+    recipes = cursor.execute(
+        "SELECT recipe_name, components, last_recommended FROM recipes_v1 "
+        "ORDER BY rowid"
+    ).fetchall()
+
+    for recipe_name, components, last_recommended in recipes:
+        requirements = get_recipe_requirements(json.loads(components))
+
+        cursor.execute(
+            "INSERT INTO recipes (recipe_name, component_count, last_recommended) "
+            "VALUES (?,?,?)",
+            (recipe_name, len(requirements), last_recommended),
+        )
+        recipe_id = cursor.lastrowid
+
+        for item, needed_quantity in requirements.items():
+            cursor.execute(
+                "INSERT OR IGNORE INTO components (component) VALUES (?)", (item,)
+            )
             cursor.execute(
-                "INSERT INTO components (component, total_encountered) VALUES (?,?)",
-                (component, 0),
+                "INSERT INTO recipe_components (recipe_id, component_id, q) "
+                "SELECT ?, component_id, ? FROM components WHERE component = ?",
+                (recipe_id, needed_quantity, item),
             )
 
-        db.commit()
+    cursor.execute("DROP TABLE recipes_v1")
+    cursor.execute("DROP TABLE components_v1")
 
-    return True
+
+def db_migrate(db_path: Path = DB_PATH) -> None:
+    """
+    Bring db created by an older version up to date.
+
+    :param db_path: path to database.
+    """
+    with sqlite3.connect(db_path, isolation_level=None) as db:
+        cursor = db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < 2:
+            columns = [x[1] for x in cursor.execute("PRAGMA table_info(recipes)")]
+
+            if "components" in columns:
+                logger.info("Migrating database to normalized schema.")
+                db_migrate_v1(cursor)
+
+        if version < 3:
+            db_new_book(cursor)
+            cursor.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+        db_create_indexes(cursor)
+
+        cursor.execute("COMMIT")
+
+    rebuild_recipe_index(db_path)
+
+
+def db_is_current(db_path: Path = DB_PATH) -> bool:
+    """
+    Check that db exists and has the current schema, so that it needs no migration.
+    Only schema version is read, db is opened read-only.
+
+    :param db_path: path to database.
+    :return: True if db is up to date.
+    """
+    if not db_path.is_file():
+        return False
+
+    with sqlite3.connect(db_path.resolve().as_uri() + "?mode=ro", uri=True) as db:
+        return db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
 
 
 def db_remove(db_path: Path = DB_PATH) -> None:
     """
-    Remove db file if it exists.
+    Remove db file and snapshot of its recipe book if they exist.
 
     :param db_path: path to database.
     """
     if db_path.is_file():
         db_path.unlink()
 
+    remove_snapshot(db_path)
+    drop_recipe_index(db_path)
+
 
 if __name__ == "__main__":
-    db_fill()
+    parser = argparse.ArgumentParser(description="Create db from file with recipes.")
+    parser.add_argument("--file", type=Path, default=FILE_PATH, help="Path to file.")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Path to database.")
+    parser.add_argument("--force", action="store_true", help="Recreate existing db.")
+    args = parser.parse_args()
+
+    db_fill(args.file, args.db, args.force)
@@ -1,7 +1,7 @@
-import json
-
 from aiohttp import web
 
+from src.codec import dumps
+
 
 class JSONValidationError(web.HTTPError):
     def __init__(self, message="Invalid JSON payload.", status_code=400, **kwargs):
@@ -14,5 +14,5 @@ class JSONValidationError(web.HTTPError):
         if kwargs:
             msg["error_details"] = kwargs
 
-        self.text = json.dumps(msg)
+        self.body = dumps(msg)
         self.content_type = "application/json"
@@ -0,0 +1,372 @@
+import asyncio
+
+from concurrent.futures import BrokenExecutor
+from pathlib import Path
+
+from src.db import get_possible_recipes
+from src.index import get_recipe_index, get_matcher, rebuild_recipe_index
+from src.symbols import Recipe
+from src.log import logger
+from data.config import (
+    DB_PATH,
+    MATCHING_ENGINE,
+    MATCHING_EXECUTOR_WORKERS,
+    MATCHING_EXECUTOR_THRESHOLD,
+)
+
+# Matcher of the worker process and version of its book, loaded once by initializer
+_worker_matcher = None
+_worker_version = None
+
+
+def _init_worker(db_path: Path, engine: str) -> None:
+    global _worker_matcher, _worker_version
+
+    _worker_version = rebuild_recipe_index(db_path).version
+    _worker_matcher = get_matcher(db_path, engine)
+
+
+def _worker_ready() -> bool:
+    return _worker_matcher is not None
+
+
+def _worker_match_many(fridges: list, floor: bool, min_quantity: float) -> tuple:
+    # Ids of records are valid only for the same version of the recipe book
+    return _worker_version, _worker_matcher.match_many(fridges, floor, min_quantity)
+
+
+class MatchingExecutor:
+    """
+    Pool of processes that match recipes off the event loop.
+
+    Every process holds its own copy of the recipe book,
+    so only fridges and results cross the process boundary.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        workers: int = MATCHING_EXECUTOR_WORKERS,
+        threshold: int = MATCHING_EXECUTOR_THRESHOLD,
+        engine: str = MATCHING_ENGINE,
+    ) -> None:
+        """
+        :param db_path: path to database.
+        :param workers: number of processes.
+        :param threshold: estimated work above which matching is offloaded.
+        :param engine: matching engine used by processes.
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.threshold = threshold
+        self.engine = engine
+
+        self.index = None
+        self._pool = None
+        self._starting = None
+        self._start_failed = False
+        self._restart_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """
+        Start processes and wait until they load the recipe book.
+        """
+        # Imported on first start, so that processes are not a cost of every startup
+        import multiprocessing
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.index = get_recipe_index(self.db_path)
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.db_path, self.engine),
+        )
+
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self._pool, _worker_ready)
+                for _ in range(self.workers)
+            ]
+        )
+
+        logger.debug("Started matching executor with %s workers.", self.workers)
+
+    def start_soon(self) -> None:
+        """
+        Start processes in background. Until they load the recipe book,
+        matching is done inline, so that startup doesn't wait for them.
+        """
+        self._starting = asyncio.ensure_future(self._try_start())
+
+    async def _try_start(self) -> bool:
+        """
+        Start processes. If they fail to start, their pool is shut down
+        and matching stays inline from then on.
+
+        :return: True if processes started.
+        """
+        try:
+            await self.start()
+        except Exception:
+            self._start_failed = True
+
+            logger.exception("Failed to start matching executor, matching is inline.")
+
+            await self._shutdown_pool()
+
+            return False
+
+        return True
+
+    def is_starting(self) -> bool:
+        """
+        Check if processes are being started in background.
+
+        :return: True if start is not finished yet.
+        """
+        return self._starting is not None and not self._starting.done()
+
+    async def stop(self) -> None:
+        """
+        Stop processes, letting them finish their current work.
+        """
+        if self._starting is not None:
+            starting, self._starting = self._starting, None
+
+            # Pool of an unfinished start is shut down as well
+            await asyncio.gather(starting, return_exceptions=True)
+
+        await self._shutdown_pool()
+
+    async def _shutdown_pool(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+
+            await asyncio.get_event_loop().run_in_executor(None, pool.shutdown)
+
+            logger.debug("Stopped matching executor.")
+
+    def get_work(self, fridges: list) -> int:
+        """
+        Estimate work of matching as the number of index entries it visits.
+
+        :param fridges: list of dicts of components and their quantity.
+        :return: estimated work.
+        """
+        index = get_recipe_index(self.db_path)
+        by_component = index.by_component
+
+        return sum(
+            len(by_component[x]) for fridge in fridges for x in index.get_fridge(fridge)
+        )
+
+    def offloads(self, fridges: list) -> bool:
+        """
+        Check if matching of fridges would be offloaded to a worker process.
+
+        :param fridges: list of dicts of components and their quantity.
+        :return: True if processes are started and work is over threshold.
+        """
+        if self._start_failed or self.is_starting():
+            return False
+
+        return self.get_work(fridges) > self.threshold
+
+    async def match_many(
+        self, fridges: list, floor: bool = False, min_quantity: float = 0
+    ) -> list:
+        """
+        Return recipes that can be cooked from each of fridges, matching them
+        in a worker process if the work is over threshold, or inline otherwise.
+
+        :param fridges: list of dicts of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: list of lists of Recipe records in the order of fridges.
+        """
+        if not self.offloads(fridges):
+            return get_matcher(self.db_path, self.engine).match_many(
+                fridges, floor, min_quantity
+            )
+
+        # Workers have a copy of the recipe book, so they are restarted when it changes
+        async with self._restart_lock:
+            if get_recipe_index(self.db_path) is not self.index:
+                await self.stop()
+                await self._try_start()
+
+        if self._start_failed:
+            return get_matcher(self.db_path, self.engine).match_many(
+                fridges, floor, min_quantity
+            )
+
+        try:
+            version, results = await asyncio.get_event_loop().run_in_executor(
+                self._pool, _worker_match_many, fridges, floor, min_quantity
+            )
+        except BrokenExecutor:
+            # A worker died, so processes are started anew on the next offload
+            logger.exception("Matching executor is broken, matching inline.")
+            self.index = None
+
+            return get_matcher(self.db_path, self.engine).match_many(
+                fridges, floor, min_quantity
+            )
+
+        if version != get_recipe_index(self.db_path).version:
+            # Book was reloaded meanwhile, so ids of worker results are stale
+            return get_matcher(self.db_path, self.engine).match_many(
+                fridges, floor, min_quantity
+            )
+
+        return results
+
+
+_executors = {}
+
+
+async def start_matching_executor(
+    db_path: Path = DB_PATH,
+    workers: int = MATCHING_EXECUTOR_WORKERS,
+    threshold: int = MATCHING_EXECUTOR_THRESHOLD,
+    background: bool = False,
+) -> MatchingExecutor:
+    """
+    Turn on offloading of matching to worker processes for the database.
+
+    :param db_path: path to database.
+    :param workers: number of processes.
+    :param threshold: estimated work above which matching is offloaded.
+    :param background: don't wait for processes, matching is inline until they start.
+    :return: matching executor.
+    """
+    executor = MatchingExecutor(db_path, workers, threshold)
+
+    if background:
+        executor.start_soon()
+    else:
+        await executor.start()
+
+    _executors[db_path] = executor
+
+    return executor
+
+
+async def stop_matching_executor(db_path: Path = DB_PATH) -> None:
+    """
+    Turn off offloading of matching for the database.
+
+    :param db_path: path to database.
+    """
+    executor = _executors.pop(db_path, None)
+
+    if executor is not None:
+        await executor.stop()
+
+
+def should_offload(fridges: list, db_path: Path = DB_PATH) -> bool:
+    """
+    Check if matching of fridges would be offloaded to worker processes.
+
+    :param fridges: list of dicts of components and their quantity.
+    :param db_path: path to database.
+    :return: True if executor is on and work is over its threshold.
+    """
+    executor = _executors.get(db_path)
+
+    return executor is not None and executor.offloads(fridges)
+
+
+async def match_many(
+    fridges: list,
+    db_path: Path = DB_PATH,
+    engine: str = MATCHING_ENGINE,
+    floor: bool = False,
+    min_quantity: float = 0,
+) -> list:
+    """
+    Return recipes that can be cooked from each of fridges,
+    offloading big ones to worker processes if executor is on.
+
+    :param fridges: list of dicts of components and their quantity.
+    :param db_path: path to database.
+    :param engine: "python", "numpy" or "sql" to match with a query to db.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :return: list of lists of Recipe records in the order of fridges.
+    """
+    if engine == "sql":
+        results = [
+            await get_possible_recipes(x, db_path, floor, min_quantity) for x in fridges
+        ]
+        recipe_ids = get_recipe_index(db_path).recipe_symbols.ids
+
+        return [
+            [
+                Recipe(recipe_ids[x["name"]], x["quantity"])
+                for x in recipes
+                if x["name"] in recipe_ids
+            ]
+            for recipes in results
+        ]
+
+    executor = _executors.get(db_path)
+
+    if executor is None:
+        return get_matcher(db_path, engine).match_many(fridges, floor, min_quantity)
+
+    return await executor.match_many(fridges, floor, min_quantity)
+
+
+async def match(
+    fridge_components: dict,
+    db_path: Path = DB_PATH,
+    engine: str = MATCHING_ENGINE,
+    floor: bool = False,
+    min_quantity: float = 0,
+) -> list:
+    """
+    Return recipes that can be cooked from fridge components,
+    offloading big fridges to worker processes if executor is on.
+
+    :param fridge_components: dict of components and their quantity.
+    :param db_path: path to database.
+    :param engine: "python", "numpy" or "sql" to match with a query to db.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :return: list of Recipe records in db order.
+    """
+    return (
+        await match_many([fridge_components], db_path, engine, floor, min_quantity)
+    )[0]
+
+
+async def iter_match(
+    fridge_components: dict,
+    db_path: Path = DB_PATH,
+    engine: str = MATCHING_ENGINE,
+    floor: bool = False,
+    min_quantity: float = 0,
+):
+    """
+    Return iterator of recipes that can be cooked from fridge components.
+    It is lazy when matching runs inline, otherwise all recipes are matched at once.
+
+    :param fridge_components: dict of components and their quantity.
+    :param db_path: path to database.
+    :param engine: "python", "numpy" or "sql" to match with a query to db.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :return: iterator of Recipe records in db order.
+    """
+    if engine == "sql" or should_offload([fridge_components], db_path):
+        return iter(
+            await match(fridge_components, db_path, engine, floor, min_quantity)
+        )
+
+    return get_matcher(db_path, engine).iter_match(
+        fridge_components, floor, min_quantity
+    )
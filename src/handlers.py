@@ -1,19 +1,236 @@
-import json
+import hmac
+
+from time import perf_counter
 
 from aiohttp import web
 
+from src.codec import dumps, ITEM_SEPARATOR
 from src.recipes import (
     process_payload,
+    process_batch_payload,
     get_recipes_from_components,
+    get_recipes_from_components_batch,
+    get_partial_recipes_from_components,
+    iter_recipes_from_components,
     get_last_recommended_recipes,
     get_most_popular_components,
 )
+from src.reload import reload_recipe_book
+from src.index import get_recipe_index
+from src.metrics import (
+    metrics,
+    time_stage,
+    record_startup,
+    REQUESTS,
+    REQUEST_DURATION,
+    CACHE_HITS,
+    CACHE_MISSES,
+    CACHE_HIT_RATIO,
+    CACHE_ENTRIES,
+)
+from src.exceptions import JSONValidationError
 from src.log import logger
+from data.config import ADMIN_TOKEN, STREAM_CHUNK_SIZE, PARTIAL_MATCH_MAX_LIMIT
 
 
 routes = web.RouteTableDef()
 
 
+@web.middleware
+async def metrics_middleware(request: web.Request, handler) -> web.StreamResponse:
+    """
+    Count requests and time them by route, method and status.
+
+    :param request: web.Request of aiohttp module.
+    :param handler: handler of the route.
+    :return: response of handler.
+    """
+    started = perf_counter()
+    status = 500
+
+    try:
+        response = await handler(request)
+        status = response.status
+
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        # Unmatched paths are not labels, so that their number stays bounded
+        route = resource.canonical if resource is not None else "unmatched"
+
+        metrics.inc(REQUESTS, method=request.method, route=route, status=status)
+        metrics.observe(
+            REQUEST_DURATION,
+            perf_counter() - started,
+            method=request.method,
+            route=route,
+        )
+
+        startup_duration = record_startup("first_request")
+        if startup_duration is not None:
+            logger.info("Handled first request %.3f s after start.", startup_duration)
+
+
+def json_response(data) -> web.Response:
+    """
+    Encode data to json and wrap it into response.
+
+    :param data: object to encode.
+    :return: web.Response.
+    """
+    with time_stage("serialization"):
+        body = dumps(data)
+
+    return web.Response(body=body, content_type="application/json")
+
+
+def get_int_parameter(
+    request: web.Request,
+    name: str,
+    default: int,
+    minimum: int = 1,
+    maximum: int = None,
+) -> int:
+    """
+    Get integer query parameter, positive by default, or raise JSONValidationError.
+
+    :param request: web.Request of aiohttp module.
+    :param name: name of the parameter.
+    :param default: value used if parameter is missing.
+    :param minimum: min allowed value.
+    :param maximum: max allowed value, unbounded if None.
+    :return: value of the parameter.
+    """
+    if name not in request.query:
+        return default
+
+    try:
+        value = int(request.query[name])
+        assert value >= minimum
+        assert maximum is None or value <= maximum
+    except (ValueError, AssertionError):
+        logger.debug("Query parameter '%s' is invalid.", name)
+        raise JSONValidationError(message="Invalid query parameter.", parameter=name)
+
+    return value
+
+
+def get_bool_parameter(request: web.Request, name: str, default: bool = False) -> bool:
+    """
+    Get boolean query parameter: 1, true or yes and 0, false or no in any case,
+    or raise JSONValidationError.
+
+    :param request: web.Request of aiohttp module.
+    :param name: name of the parameter.
+    :param default: value used if parameter is missing.
+    :return: value of the parameter.
+    """
+    if name not in request.query:
+        return default
+
+    value = request.query[name].lower()
+
+    if value in ("1", "true", "yes"):
+        return True
+    if value in ("0", "false", "no"):
+        return False
+
+    logger.debug("Query parameter '%s' is invalid.", name)
+    raise JSONValidationError(message="Invalid query parameter.", parameter=name)
+
+
+def check_admin_token(request: web.Request) -> None:
+    """
+    Check that request has the admin token or raise JSONValidationError.
+    Admin endpoints are off if no token is configured.
+
+    :param request: web.Request of aiohttp module.
+    """
+    token = request.headers.get("X-Admin-Token", "")
+
+    if ADMIN_TOKEN is None or not hmac.compare_digest(
+        token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")
+    ):
+        logger.warning("Rejected admin request from %s.", request.remote)
+        raise JSONValidationError(message="Forbidden.", status_code=403)
+
+
+def get_matching_options(request: web.Request) -> tuple:
+    """
+    Get floor and min_quantity query parameters or raise JSONValidationError.
+
+    :param request: web.Request of aiohttp module.
+    :return: tuple of floor flag and non-negative min quantity.
+    """
+    floor = get_bool_parameter(request, "floor")
+
+    try:
+        min_quantity = float(request.query.get("min_quantity", 0))
+        assert 0 <= min_quantity < float("inf")
+    except (ValueError, AssertionError):
+        logger.debug("Query parameter 'min_quantity' is invalid.")
+        raise JSONValidationError(
+            message="Invalid query parameter.", parameter="min_quantity"
+        )
+
+    return floor, min_quantity
+
+
+async def stream_recipes(
+    request: web.Request,
+    fridge_components: dict,
+    ndjson: bool,
+    floor: bool = False,
+    min_quantity: float = 0,
+) -> web.StreamResponse:
+    """
+    Write possible recipes to response in chunks as they are matched.
+
+    :param request: web.Request of aiohttp module.
+    :param fridge_components: dict of components and their quantity.
+    :param ndjson: write newline delimited JSON instead of JSON array.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :return: web.StreamResponse.
+    """
+    response = web.StreamResponse()
+    response.content_type = "application/x-ndjson" if ndjson else "application/json"
+    response.charset = "utf-8"
+    response.enable_chunked_encoding()
+
+    await response.prepare(request)
+
+    chunk = [] if ndjson else [b"["]
+    count = 0
+    async for recipe in iter_recipes_from_components(
+        fridge_components, floor=floor, min_quantity=min_quantity
+    ):
+        data = dumps(recipe)
+
+        if ndjson:
+            chunk.append(data + b"\n")
+        else:
+            chunk.append(ITEM_SEPARATOR + data if count else data)
+
+        count += 1
+        if not count % STREAM_CHUNK_SIZE:
+            await response.write(b"".join(chunk))
+            chunk = []
+
+    if not ndjson:
+        chunk.append(b"]")
+
+    await response.write(b"".join(chunk))
+    await response.write_eof()
+
+    logger.debug("Streamed %s possible recipes.", count)
+
+    return response
+
+
 @routes.get("/")
 async def handler_index(request: web.Request) -> web.Response:
     page = """
@@ -25,8 +242,11 @@ async def handler_index(request: web.Request) -> web.Response:
     </head>
     <body>
         <p><a href="/recipes/possible">POST /recipes/possible</a>
+        <p><a href="/recipes/possible/batch">POST /recipes/possible/batch</a>
+        <p><a href="/recipes/partial">POST /recipes/partial</a>
         <p><a href="/recipes/last">GET /recipes/last</a>
         <p><a href="/components/popular">GET /components/popular</a>
+        <p><a href="/metrics">GET /metrics</a>
     </body>
     </html>
     """
@@ -39,51 +259,170 @@ async def handler_recipes(request: web.Request) -> web.Response:
     """
     Receives json with components and returns json with possible recipes.
 
+    Results are streamed as ndjson if "application/x-ndjson" is accepted,
+    or as chunked json array if stream query parameter is true.
+    Whole portions are returned if floor query parameter is set and recipes
+    with less than min_quantity query parameter are left out.
+
     :param request: web.Request of aiohttp module.
-    :return: web.json_response.
+    :return: web.Response or web.StreamResponse.
     """
     logger.debug("Requesting possible recipes from ingredient list.")
 
-    payload = await request.text()
+    floor, min_quantity = get_matching_options(request)
+
+    payload = await request.read()
+
+    with time_stage("validation"):
+        fridge_components = await process_payload(payload)
+    logger.debug("Received payload: %s", fridge_components)
+
+    if "application/x-ndjson" in request.headers.get("Accept", ""):
+        return await stream_recipes(
+            request, fridge_components, True, floor, min_quantity
+        )
+    if get_bool_parameter(request, "stream"):
+        return await stream_recipes(
+            request, fridge_components, False, floor, min_quantity
+        )
+
+    possible_recipes = await get_recipes_from_components(
+        fridge_components, floor, min_quantity
+    )
+    logger.debug("Possible recipes: %s", possible_recipes)
+
+    return json_response(possible_recipes)
+
+
+@routes.post("/recipes/partial")
+async def handler_partial_recipes(request: web.Request) -> web.Response:
+    """
+    Receives json with components and returns json with up to limit recipes,
+    50 by default, that lack at most max_missing components, 1 by default,
+    with the missing components, the ones that lack fewer first.
+
+    :param request: web.Request of aiohttp module.
+    :return: web.Response.
+    """
+    logger.debug("Requesting partially possible recipes from ingredient list.")
+
+    max_missing = get_int_parameter(request, "max_missing", 1, minimum=0)
+    limit = get_int_parameter(request, "limit", 50, maximum=PARTIAL_MATCH_MAX_LIMIT)
+
+    payload = await request.read()
+
+    with time_stage("validation"):
+        fridge_components = await process_payload(payload)
+
+    partial_recipes = await get_partial_recipes_from_components(
+        fridge_components, max_missing, limit
+    )
+    logger.debug("Partially possible recipes: %s", partial_recipes)
+
+    return json_response(partial_recipes)
+
 
-    fridge_components = await process_payload(payload)
-    logger.debug("Received payload: {}".format(fridge_components))
+@routes.post("/recipes/possible/batch")
+async def handler_recipes_batch(request: web.Request) -> web.Response:
+    """
+    Receives json array or ndjson of fridges and returns json array
+    with possible recipes for each of them in the same order.
+    Takes floor and min_quantity query parameters as /recipes/possible does.
+
+    :param request: web.Request of aiohttp module.
+    :return: web.Response.
+    """
+    logger.debug("Requesting possible recipes for batch of ingredient lists.")
+
+    floor, min_quantity = get_matching_options(request)
+
+    payload = await request.read()
+    ndjson = request.content_type == "application/x-ndjson"
+
+    with time_stage("validation"):
+        fridges = await process_batch_payload(payload, ndjson)
+    logger.debug("Received batch of %s fridges.", len(fridges))
 
-    possible_recipes = await get_recipes_from_components(fridge_components)
-    logger.debug("Possible recipes: {}".format(possible_recipes))
+    possible_recipes = await get_recipes_from_components_batch(
+        fridges, floor, min_quantity
+    )
 
-    return web.json_response(text=json.dumps(possible_recipes, ensure_ascii=False))
+    return json_response(possible_recipes)
 
 
 @routes.get("/recipes/last")
 async def handler_last_recommended_recipes(request: web.Request) -> web.Response:
     """
-    Returns recipes recommended in the last hour.
+    Returns recipes recommended in the last time_period seconds, an hour by default.
 
     :param request: web.Request of aiohttp module.
-    :return: web.json_response.
+    :return: web.Response.
     """
     logger.debug("Requesting last recommended recipes.")
 
-    recommended_recipes = await get_last_recommended_recipes()
-    logger.debug("Recommended recipes: {}".format(recommended_recipes))
+    time_period = get_int_parameter(request, "time_period", 3600)
+
+    recommended_recipes = await get_last_recommended_recipes(time_period)
+    logger.debug("Recommended recipes: %s", recommended_recipes)
 
-    return web.json_response(text=json.dumps(recommended_recipes, ensure_ascii=False))
+    return json_response(recommended_recipes)
 
 
 @routes.get("/components/popular")
 async def handler_popular_components(request: web.Request) -> web.Response:
     """
-    Returns 10 most popular components in users' fridges.
+    Returns limit most popular components in users' fridges, 10 by default.
 
     :param request: web.Request of aiohttp module.
-    :return: web.json_response.
+    :return: web.Response.
     """
     logger.debug("Requesting most popular components.")
 
-    most_popular_components = await get_most_popular_components()
-    logger.debug("Most popular components: {}".format(most_popular_components))
+    limit = get_int_parameter(request, "limit", 10)
+
+    most_popular_components = await get_most_popular_components(limit)
+    logger.debug("Most popular components: %s", most_popular_components)
+
+    return json_response(most_popular_components)
+
+
+@routes.post("/admin/reload")
+async def handler_reload(request: web.Request) -> web.Response:
+    """
+    Reloads recipe book from data file, keeping statistics, and returns
+    the number of recipes and components in it.
+    Requires admin token in X-Admin-Token header.
+
+    :param request: web.Request of aiohttp module.
+    :return: web.Response.
+    """
+    logger.debug("Requesting reload of recipe book.")
+
+    check_admin_token(request)
+
+    index = await reload_recipe_book()
+
+    return json_response(
+        {"recipes": len(index.recipe_names), "components": len(index.components)}
+    )
+
+
+@routes.get("/metrics")
+async def handler_metrics(request: web.Request) -> web.Response:
+    """
+    Returns counters and latency histograms in Prometheus text format.
+
+    :param request: web.Request of aiohttp module.
+    :return: web.Response.
+    """
+    result_cache = get_recipe_index().result_cache
+    lookups = result_cache.hits + result_cache.misses
+
+    metrics.set(CACHE_HITS, result_cache.hits)
+    metrics.set(CACHE_MISSES, result_cache.misses)
+    metrics.set(CACHE_HIT_RATIO, result_cache.hits / lookups if lookups else 0.0)
+    metrics.set(CACHE_ENTRIES, len(result_cache))
 
-    return web.json_response(
-        text=json.dumps(most_popular_components, ensure_ascii=False)
+    return web.Response(
+        text=metrics.render(), content_type="text/plain", charset="utf-8"
     )
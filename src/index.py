@@ -0,0 +1,407 @@
+import heapq
+import math
+import sqlite3
+
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from src.cache import ResultCache
+from src.symbols import Recipe, SymbolTable
+from src.log import logger
+from data.config import DB_PATH, MATCHING_ENGINE, RECIPE_INDEX_SNAPSHOT
+
+
+def get_book_version(db: sqlite3.Connection) -> int:
+    """
+    Get version of the recipe book in db. It is a random generation id
+    given to every new book, so reload of the book in another process
+    or replacement of the db file can be noticed.
+
+    :param db: db connection.
+    :return: generation id of the book.
+    """
+    return db.execute("SELECT generation FROM book").fetchone()[0]
+
+
+class RecipeIndex:
+    """
+    In-memory inverted index of the recipe book.
+
+    Maps every component to the recipes that need it, so that matching only
+    touches recipes that share at least one component with the fridge.
+    Recipes and components are referred to by ids of their symbol tables.
+    """
+
+    def __init__(self, recipes: list, components=None, version: int = 0) -> None:
+        """
+        :param recipes: list of (recipe_name, [{"item": ..., "q": ...}, ...]) in db order.
+        :param components: names of all known components, taken from recipes if omitted.
+        :param version: version of the recipe book in db that index is built from.
+        """
+        self.version = version
+
+        # Vocabulary of valid components for payload validation
+        self.recipe_symbols = SymbolTable()
+        self.component_symbols = SymbolTable(components or ())
+
+        # Components of recipe i are entries from offsets[i] to offsets[i + 1]
+        self.offsets = array("I", [0])
+        self.entry_components = array("I")
+        self.entry_quantities = array("d")
+
+        self.required_counts = array("I")
+
+        # Recipes that need every component, by component id
+        self.by_component = []
+
+        for recipe_name, recipe_components in recipes:
+            self.add_recipe(
+                recipe_name,
+                [
+                    (self.component_symbols.add(x["item"]), x["q"])
+                    for x in recipe_components
+                ],
+            )
+
+        while len(self.by_component) < len(self.component_symbols):
+            self.by_component.append(array("I"))
+
+        # Results are valid as long as the recipe book is, so cache lives with index
+        self.result_cache = ResultCache()
+
+        self._matrix = None
+
+    @property
+    def recipe_names(self) -> list:
+        """
+        Names of recipes by their ids.
+        """
+        return self.recipe_symbols.names
+
+    @property
+    def components(self) -> SymbolTable:
+        """
+        Names of all known components.
+        """
+        return self.component_symbols
+
+    def add_recipe(self, recipe_name: str, requirements: list) -> int:
+        """
+        Add recipe to the end of the index.
+
+        :param recipe_name: name of the recipe.
+        :param requirements: list of (component_id, quantity) of the recipe.
+        :return: id of the recipe.
+        """
+        recipe_id = self.recipe_symbols.add(recipe_name)
+
+        while len(self.by_component) < len(self.component_symbols):
+            self.by_component.append(array("I"))
+
+        for component_id, needed_quantity in requirements:
+            self.entry_components.append(component_id)
+            self.entry_quantities.append(needed_quantity)
+
+            self.by_component[component_id].append(recipe_id)
+
+        self.offsets.append(len(self.entry_components))
+        self.required_counts.append(len(requirements))
+
+        return recipe_id
+
+    @classmethod
+    def from_db(cls, db_path: Path = DB_PATH) -> "RecipeIndex":
+        """
+        Build index from the recipes tables.
+
+        Names are read once from their tables and components of recipes by ids,
+        so that rows do not repeat them.
+
+        :param db_path: path to database.
+        :return: recipe index.
+        """
+        with sqlite3.connect(db_path, isolation_level=None) as db:
+            # Read in one transaction, so that a concurrent reload is not mixed in
+            db.execute("BEGIN")
+
+            version = get_book_version(db)
+            components = db.execute(
+                "SELECT component_id, component FROM components ORDER BY component_id"
+            ).fetchall()
+            recipes = db.execute(
+                "SELECT recipe_id, recipe_name FROM recipes ORDER BY recipe_id"
+            ).fetchall()
+            rows = db.execute(
+                "SELECT recipe_id, component_id, q FROM recipe_components "
+                "ORDER BY recipe_id"
+            ).fetchall()
+
+            db.execute("COMMIT")
+
+        index = cls([], [x[1] for x in components], version)
+
+        # Ids of db are not dense, so they are mapped to ids of symbol tables
+        component_ids = {x[0]: i for i, x in enumerate(components)}
+
+        requirements = {}
+        for recipe_id, component_id, needed_quantity in rows:
+            requirements.setdefault(recipe_id, []).append(
+                (component_ids[component_id], needed_quantity)
+            )
+
+        for recipe_id, recipe_name in recipes:
+            index.add_recipe(recipe_name, requirements.pop(recipe_id, []))
+
+        return index
+
+    def get_recipes(self, recipes: list) -> list:
+        """
+        Get names of matched recipes, so that they can be returned to a client.
+
+        :param recipes: list of Recipe records of this index.
+        :return: list of dicts with names and quantities of recipes.
+        """
+        names = self.recipe_symbols.names
+
+        return [{"name": names[x.recipe_id], "quantity": x.quantity} for x in recipes]
+
+    def get_fridge(self, fridge_components: dict) -> dict:
+        """
+        Get ids of fridge components that are known to index.
+
+        :param fridge_components: dict of components and their quantity.
+        :return: dict of component ids and their quantity.
+        """
+        component_ids = self.component_symbols.ids
+
+        return {
+            component_ids[component]: quantity
+            for component, quantity in fridge_components.items()
+            if component in component_ids
+        }
+
+    def match(
+        self, fridge_components: dict, floor: bool = False, min_quantity: float = 0
+    ) -> list:
+        """
+        Return recipes that can be cooked from fridge components.
+
+        :param fridge_components: dict of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: list of Recipe records in db order.
+        """
+        return list(self.iter_match(fridge_components, floor, min_quantity))
+
+    def iter_match(
+        self, fridge_components: dict, floor: bool = False, min_quantity: float = 0
+    ):
+        """
+        Yield recipes that can be cooked from fridge components one by one.
+
+        A recipe is possible when every one of its components was hit by the fridge,
+        which is decided by comparing hit count with the number of required components.
+        Quantity is computed over arrays of entries of possible recipes only,
+        and recipes below min_quantity are left out before their results are built.
+
+        :param fridge_components: dict of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: generator of Recipe records in db order.
+        """
+        required_counts = self.required_counts
+
+        available = self.get_fridge(fridge_components)
+        hits = self.count_hits(available)
+        possible = [x for x, count in hits.items() if count == required_counts[x]]
+        possible.sort()
+
+        # Whole portions reach min_quantity only if quantity reaches its ceiling
+        threshold = math.ceil(min_quantity) if floor else min_quantity
+
+        offsets = self.offsets
+        entry_components = self.entry_components
+        entry_quantities = self.entry_quantities
+
+        for recipe_id in possible:
+            quantity = min(
+                [
+                    available[entry_components[i]] / entry_quantities[i]
+                    for i in range(offsets[recipe_id], offsets[recipe_id + 1])
+                ]
+            )
+
+            if quantity < threshold:
+                continue
+
+            yield Recipe(recipe_id, math.floor(quantity) if floor else quantity)
+
+    def count_hits(self, available: dict) -> Counter:
+        """
+        Count components that every recipe shares with the fridge.
+        Only recipes sharing at least one component are visited.
+
+        :param available: dict of component ids and their quantity.
+        :return: counter of recipe ids and numbers of shared components.
+        """
+        by_component = self.by_component
+
+        hits = Counter()
+        for component_id in available:
+            hits.update(by_component[component_id])
+
+        return hits
+
+    def match_partial(
+        self, fridge_components: dict, max_missing: int = 1, limit: int = 50
+    ) -> list:
+        """
+        Return recipes that lack at most max_missing components of the fridge,
+        the ones with fewer missing components first, then in db order.
+
+        Only recipes that share components with the fridge are considered
+        and only the best limit of them are selected with a heap,
+        so the cost depends on the overlap and not on the size of the book.
+
+        :param fridge_components: dict of components and their quantity.
+        :param max_missing: max number of components that a recipe may lack.
+        :param limit: max number of recipes to return.
+        :return: list of recipes with their missing components.
+        """
+        required_counts = self.required_counts
+
+        available = self.get_fridge(fridge_components)
+
+        candidates = []
+        for recipe_id, hit_count in self.count_hits(available).items():
+            missing_count = required_counts[recipe_id] - hit_count
+
+            if missing_count <= max_missing:
+                candidates.append((missing_count, recipe_id))
+
+        recipes = []
+        for _, recipe_id in heapq.nsmallest(limit, candidates):
+            missing = []
+            quantities = []
+
+            for i in range(self.offsets[recipe_id], self.offsets[recipe_id + 1]):
+                available_quantity = available.get(self.entry_components[i])
+
+                if available_quantity is None:
+                    missing.append(
+                        self.component_symbols.names[self.entry_components[i]]
+                    )
+                else:
+                    quantities.append(available_quantity / self.entry_quantities[i])
+
+            # Quantity that could be cooked once missing components are bought
+            recipes.append(
+                {
+                    "name": self.recipe_names[recipe_id],
+                    "quantity": min(quantities),
+                    "missing": missing,
+                }
+            )
+
+        return recipes
+
+    def match_many(
+        self, fridges: list, floor: bool = False, min_quantity: float = 0
+    ) -> list:
+        """
+        Return recipes that can be cooked from each of fridges.
+
+        :param fridges: list of dicts of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: list of lists of Recipe records in the order of fridges.
+        """
+        return [self.match(x, floor, min_quantity) for x in fridges]
+
+    @property
+    def matrix(self):
+        """
+        Recipe matrix of the same recipes, built on first use.
+        """
+        if self._matrix is None:
+            from src.matrix import RecipeMatrix
+
+            self._matrix = RecipeMatrix(
+                len(self.recipe_symbols),
+                self.component_symbols.ids,
+                self.offsets,
+                self.entry_components,
+                self.entry_quantities,
+            )
+
+        return self._matrix
+
+
+_indexes = {}
+
+
+def get_recipe_index(db_path: Path = DB_PATH) -> RecipeIndex:
+    """
+    Get recipe index of the database, building it on first use.
+
+    :param db_path: path to database.
+    :return: recipe index.
+    """
+    index = _indexes.get(db_path)
+
+    if index is None:
+        index = rebuild_recipe_index(db_path)
+
+    return index
+
+
+def get_matcher(db_path: Path = DB_PATH, engine: str = MATCHING_ENGINE):
+    """
+    Get recipe matcher of the database for the matching engine.
+
+    :param db_path: path to database.
+    :param engine: "numpy" for recipe matrix or recipe index otherwise.
+    :return: object with match and match_many methods.
+    """
+    index = get_recipe_index(db_path)
+
+    if engine == "numpy":
+        return index.matrix
+
+    return index
+
+
+def rebuild_recipe_index(db_path: Path = DB_PATH) -> RecipeIndex:
+    """
+    Build recipe index of the database and replace the previous one.
+    If snapshots are on, index is mapped from the snapshot of the database.
+
+    :param db_path: path to database.
+    :return: recipe index.
+    """
+    if RECIPE_INDEX_SNAPSHOT:
+        from src.snapshot import load_recipe_index
+
+        index = load_recipe_index(db_path)
+    else:
+        index = RecipeIndex.from_db(db_path)
+
+    _indexes[db_path] = index
+
+    logger.debug(
+        "Built recipe index of %s recipes and %s components.",
+        len(index.recipe_symbols),
+        len(index.component_symbols),
+    )
+
+    return index
+
+
+def drop_recipe_index(db_path: Path = DB_PATH) -> None:
+    """
+    Forget recipe index of the database.
+
+    :param db_path: path to database.
+    """
+    _indexes.pop(db_path, None)
@@ -0,0 +1,113 @@
+"""
+https://github.com/ICRAR/ijson
+"""
+import json
+import re
+
+from itertools import islice
+from pathlib import Path
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover
+    ijson = None
+
+from data.config import FILE_PATH, LOADER_CHUNK_SIZE
+
+# Start of the array of recipes in the top level object
+RECIPES_START = re.compile(r'"recipes"\s*:\s*\[')
+# Whitespace and commas between items of the array
+ITEMS_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def iter_recipes_chunked(
+    file_path: Path = FILE_PATH, chunk_size: int = LOADER_CHUNK_SIZE
+):
+    """
+    Yield recipes from file one by one, reading it in chunks,
+    so that memory does not depend on the size of the file.
+
+    :param file_path: path to file with data.
+    :param chunk_size: number of characters read at once.
+    :return: iterator of recipes in file order.
+    """
+    decoder = json.JSONDecoder()
+
+    with file_path.open(encoding="UTF-8") as f:
+        buffer = ""
+
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise json.JSONDecodeError("Array of recipes not found", buffer, 0)
+
+            buffer += chunk
+            start = RECIPES_START.search(buffer)
+
+            if start is not None:
+                buffer = buffer[start.end() :]
+                break
+
+            # Keep the key or its beginning in case it is split between chunks
+            key = buffer.rfind('"recipes"')
+            buffer = buffer[key:] if key >= 0 else buffer[-len('"recipes"') + 1 :]
+
+        position = 0
+        while True:
+            position = ITEMS_SEPARATOR.match(buffer, position).end()
+
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            try:
+                recipe, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Recipe is not read completely yet
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield recipe
+
+            if position >= chunk_size:
+                buffer = buffer[position:]
+                position = 0
+
+
+def iter_recipes(file_path: Path = FILE_PATH):
+    """
+    Yield recipes from file one by one, with ijson if it is installed.
+
+    :param file_path: path to file with data.
+    :return: iterator of recipes in file order.
+    """
+    if ijson is None:
+        return iter_recipes_chunked(file_path)
+
+    def parse():
+        with file_path.open("rb") as f:
+            yield from ijson.items(f, "recipes.item", use_float=True)
+
+    return parse()
+
+
+def iter_batches(iterable, size: int):
+    """
+    Split iterable into lists of the given size, the last one may be shorter.
+
+    :param iterable: iterable to split.
+    :param size: max number of items in a batch.
+    :return: iterator of batches.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+
+        yield batch
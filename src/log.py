@@ -1,10 +1,73 @@
+import atexit
 import logging
 import logging.handlers
+import os
 
 from pathlib import Path
+from queue import SimpleQueue
 from sys import stdout
 
-from data.config import LOG_PATH, LOGGER_NAME, LOGGER_LEVEL, LOGGER_FORMAT
+from data.config import (
+    LOG_PATH,
+    LOGGER_NAME,
+    LOGGER_LEVEL,
+    LOGGER_FORMAT,
+    LOGGER_FILE_HANDLER,
+)
+
+# Listeners of queue handlers, each with a thread that writes records
+_listeners = []
+
+
+def get_queue_handler(handler: logging.Handler) -> logging.handlers.QueueHandler:
+    """
+    Wrap handler, so that records are put into a queue and written by
+    a background thread, and logging calls don't wait for I/O.
+
+    :param handler: handler that writes records.
+    :return: handler that puts records into the queue.
+    """
+    queue_handler = logging.handlers.QueueHandler(SimpleQueue())
+
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, handler, respect_handler_level=True
+    )
+    listener.start()
+
+    _listeners.append((queue_handler, listener))
+
+    return queue_handler
+
+
+def stop_queue_listeners() -> None:
+    """
+    Write records that are left in queues and stop threads of listeners.
+    """
+    while _listeners:
+        _, listener = _listeners.pop()
+        listener.stop()
+
+
+def _restart_queue_listeners() -> None:
+    # Threads are not copied by fork, so a child process starts its own listeners
+    listeners = list(_listeners)
+    _listeners.clear()
+
+    for queue_handler, listener in listeners:
+        queue_handler.queue = SimpleQueue()
+
+        listener = logging.handlers.QueueListener(
+            queue_handler.queue, *listener.handlers, respect_handler_level=True
+        )
+        listener.start()
+
+        _listeners.append((queue_handler, listener))
+
+
+atexit.register(stop_queue_listeners)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_queue_listeners)
 
 
 def get_logger(
@@ -12,7 +75,7 @@ def get_logger(
     logger_level: int = LOGGER_LEVEL,
     logger_format: str = LOGGER_FORMAT,
     stdout_handler: bool = False,
-    file_handler: bool = False,
+    file_handler: bool = LOGGER_FILE_HANDLER,
     file_name: Path = LOG_PATH,
 ) -> logging.Logger:
     """
@@ -22,7 +85,7 @@ def get_logger(
     :param logger_level: level of logs.
     :param logger_format: format of logs.
     :param stdout_handler: create stdout handler or not.
-    :param file_handler: create file handler or not.
+    :param file_handler: create file handler, writing in a background thread, or not.
     :param file_name: name of log files.
     :return: logger object.
     """
@@ -35,9 +98,11 @@ def get_logger(
         logger.addHandler(handler)
 
     if file_handler:
+        file_name.parent.mkdir(parents=True, exist_ok=True)
+
         handler = logging.handlers.TimedRotatingFileHandler(file_name, when="midnight")
         handler.setFormatter(logging.Formatter(logger_format))
-        logger.addHandler(handler)
+        logger.addHandler(get_queue_handler(handler))
 
     return logger
 
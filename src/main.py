@@ -1,53 +1,283 @@
+import argparse
 import logging
 
+from functools import partial
 from aiohttp import web
-from aiohttp_cache import setup_cache
 
-from src.handlers import routes
-from src.db import db_fill
+from src.handlers import routes, metrics_middleware
+from src.db import (
+    db_fill,
+    db_is_current,
+    db_migrate,
+    db_reload,
+    open_pool,
+    close_pool,
+)
+from src.index import get_matcher, get_recipe_index
+from src.snapshot import db_snapshot
+from src.executor import start_matching_executor, stop_matching_executor
+from src.stats import start_write_behind, stop_write_behind
+from src.reload import FileWatch, start_recipe_book_watcher, stop_recipe_book_watcher
+from src.metrics import record_startup
 from src.log import logger
-from data.config import OVERALL_LOG_LEVEL
+from data.config import (
+    FAST_START,
+    FILE_PATH,
+    OVERALL_LOG_LEVEL,
+    RECIPE_BOOK_WATCH,
+    RECIPE_INDEX_SNAPSHOT,
+    STATS_WRITE_BEHIND,
+    MATCHING_EXECUTOR_WORKERS,
+)
 
 
-async def db_init(app) -> None:
+def db_prepare(fast_start: bool = FAST_START) -> None:
     """
     If db doesn't exist, create it and transfer data from file.
+
+    :param fast_start: only check schema version of existing db instead of migrating it.
     """
+    if fast_start and db_is_current():
+        logger.debug("Database is up to date.")
+        return
+
     if db_fill():
         logger.debug("Database created.")
     else:
         logger.debug("Database already exists.")
 
+        db_migrate()
+
+
+async def db_init(app) -> None:
+    """
+    Prepare db.
+    """
+    db_prepare()
+
+
+async def index_init(app) -> None:
+    """
+    Load recipe index or matrix into memory.
+    """
+    get_matcher()
+
+
+async def db_pool_open(app) -> None:
+    """
+    Open persistent connections to db.
+    """
+    await open_pool()
+
+
+async def db_pool_close(app) -> None:
+    """
+    Close persistent connections to db.
+    """
+    await close_pool()
+
+
+async def stats_start(app) -> None:
+    """
+    Start background flushing of buffered statistics.
+    """
+    start_write_behind()
+
+
+async def stats_stop(app) -> None:
+    """
+    Stop background flushing and write remaining statistics to db.
+    """
+    await stop_write_behind()
+
+
+async def executor_start(app) -> None:
+    """
+    Start processes for offloaded matching.
+    """
+    await start_matching_executor(background=FAST_START)
+
+
+async def executor_stop(app) -> None:
+    """
+    Stop processes for offloaded matching.
+    """
+    await stop_matching_executor()
+
+
+async def watcher_start(app) -> None:
+    """
+    Start checking recipe book for changes.
+    """
+    start_recipe_book_watcher(watch_file=app["watch_file"])
+
 
-def start_server(host: str = "0.0.0.0", port: int = 8080) -> None:
+async def watcher_stop(app) -> None:
+    """
+    Stop checking recipe book for changes.
+    """
+    await stop_recipe_book_watcher()
+
+
+async def startup_done(app) -> None:
+    """
+    Record time from start of the process until the application is ready.
+    """
+    startup_duration = record_startup("ready")
+    if startup_duration is not None:
+        logger.info("Started in %.3f s.", startup_duration)
+
+
+def create_app(
+    prepare_db: bool = True, watch_file: bool = RECIPE_BOOK_WATCH
+) -> web.Application:
+    """
+    Create aiohttp application.
+
+    :param prepare_db: create or migrate db on startup.
+    :param watch_file: reload recipe book when data file changes.
+    :return: application.
+    """
+    app = web.Application(middlewares=[metrics_middleware])
+    app["watch_file"] = watch_file
+
+    for route in routes:
+        logger.debug("Adding route: %s.", route)
+
+    app.add_routes(routes)
+
+    if prepare_db:
+        app.on_startup.append(db_init)
+    app.on_startup.append(index_init)
+    app.on_startup.append(db_pool_open)
+
+    if MATCHING_EXECUTOR_WORKERS:
+        app.on_startup.append(executor_start)
+        app.on_cleanup.append(executor_stop)
+
+    if STATS_WRITE_BEHIND:
+        app.on_startup.append(stats_start)
+        app.on_cleanup.append(stats_stop)
+
+    app.on_startup.append(watcher_start)
+    app.on_cleanup.append(watcher_stop)
+
+    app.on_startup.append(startup_done)
+
+    app.on_cleanup.append(db_pool_close)
+
+    return app
+
+
+def start_server(
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    sock=None,
+    reuse_port: bool = False,
+    prepare_db: bool = True,
+    watch_file: bool = RECIPE_BOOK_WATCH,
+) -> None:
     """
     Start aiohttp server.
 
     :param host: address of the server.
     :param port: port of the server.
+    :param sock: already bound socket to serve on instead of host and port.
+    :param reuse_port: bind with SO_REUSEPORT, so that several processes can share port.
+    :param prepare_db: create or migrate db on startup.
+    :param watch_file: reload recipe book when data file changes.
     """
-    app = web.Application()
+    app = create_app(prepare_db, watch_file)
 
-    setup_cache(app)
+    if sock is not None:
+        logger.info("Starting server on inherited socket %s.", sock.getsockname())
+        web.run_app(app, sock=sock)
+    else:
+        logger.info("Starting server on %s:%s.", host, port)
+        web.run_app(app, host=host, port=port, reuse_port=reuse_port or None)
 
-    for route in routes:
-        logger.debug("Adding route: {}.".format(route))
 
-    app.add_routes(routes)
+def start_workers(
+    host: str = "0.0.0.0", port: int = 8080, workers: int = 2, reuse_port: bool = False
+) -> None:
+    """
+    Prepare db once and start supervised aiohttp worker processes.
+    Workers either share one pre-bound socket or bind their own with SO_REUSEPORT.
+
+    :param host: address of the server.
+    :param port: port of the server.
+    :param workers: number of worker processes.
+    :param reuse_port: workers bind with SO_REUSEPORT instead of sharing a socket.
+    """
+    from src.workers import Supervisor, create_listening_socket
+
+    db_prepare()
+
+    # Snapshot is brought up to date once, workers map it instead of building index
+    if RECIPE_INDEX_SNAPSHOT:
+        get_recipe_index()
+
+    sock = None if reuse_port else create_listening_socket(host, port)
+
+    target = partial(
+        start_server,
+        host,
+        port,
+        sock=sock,
+        reuse_port=reuse_port,
+        prepare_db=False,
+        watch_file=False,
+    )
 
-    app.on_startup.append(db_init)
+    # Book is reloaded once by supervisor, workers notice it in db
+    callback = None
+    if RECIPE_BOOK_WATCH:
+        file_watch = FileWatch()
 
-    logger.info("Starting server on {}:{}.".format(host, port))
-    web.run_app(app, host=host, port=port)
+        def callback():
+            if file_watch.changed() and FILE_PATH.is_file():
+                try:
+                    db_reload()
+
+                    if RECIPE_INDEX_SNAPSHOT:
+                        db_snapshot()
+                except Exception:
+                    # File may be still being written, it is retried on the next check
+                    file_watch.state = None
+                    raise
+
+    logger.info("Starting %s workers on %s:%s.", workers, host, port)
+
+    try:
+        Supervisor(target, workers, callback).run()
+    finally:
+        if sock is not None:
+            sock.close()
 
 
 def main() -> None:
     """
-    Set logging level and launch server.
+    Set logging level and launch server or workers.
     """
+    parser = argparse.ArgumentParser(description="Recipe service.")
+    parser.add_argument("--host", default="0.0.0.0", help="address of the server")
+    parser.add_argument("--port", type=int, default=8080, help="port of the server")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="workers bind with SO_REUSEPORT instead of sharing a socket",
+    )
+    args = parser.parse_args()
+
     logging.basicConfig(level=OVERALL_LOG_LEVEL)
 
-    start_server()
+    if args.workers > 1:
+        start_workers(args.host, args.port, args.workers, args.reuse_port)
+    else:
+        start_server(args.host, args.port, reuse_port=args.reuse_port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""
+https://numpy.org/doc/stable/reference/generated/numpy.ufunc.reduceat.html
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from src.symbols import Recipe
+from src.log import logger
+from data.config import MATRIX_CHUNK_SIZE
+
+
+class RecipeMatrix:
+    """
+    Recipe book as a sparse recipe x component quantity matrix in CSR arrays.
+
+    Feasibility and quantity of every recipe are computed with vectorized
+    operations over the whole matrix, for one fridge or many at once.
+    """
+
+    def __init__(
+        self,
+        recipe_count: int,
+        component_ids: dict,
+        offsets,
+        entry_components,
+        entry_quantities,
+    ) -> None:
+        """
+        :param recipe_count: number of recipes.
+        :param component_ids: dict of components and their ids.
+        :param offsets: array of starts of entries of every recipe and end of the last.
+        :param entry_components: array of component ids of entries.
+        :param entry_quantities: array of needed quantities of entries.
+        """
+        if np is None:
+            raise ImportError("numpy is required for the numpy matching engine.")
+
+        self.recipe_count = recipe_count
+        self.component_ids = component_ids
+
+        # Arrays of recipe index are already in CSR layout
+        self.indptr = np.asarray(offsets, dtype=np.int64)
+        self.indices = np.asarray(entry_components, dtype=np.int64)
+        self.data = np.asarray(entry_quantities, dtype=np.float64)
+
+        # reduceat needs non-empty segments, recipes without components are never possible
+        self.recipe_ids = np.flatnonzero(self.indptr[:-1] < self.indptr[1:])
+        self.starts = self.indptr[self.recipe_ids]
+
+        logger.debug(
+            "Built recipe matrix of %s recipes, %s components and %s entries.",
+            recipe_count,
+            len(self.component_ids),
+            len(self.data),
+        )
+
+    def match(
+        self, fridge_components: dict, floor: bool = False, min_quantity: float = 0
+    ) -> list:
+        """
+        Return recipes that can be cooked from fridge components.
+
+        :param fridge_components: dict of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: list of Recipe records in db order.
+        """
+        return self.match_many([fridge_components], floor, min_quantity)[0]
+
+    def iter_match(
+        self, fridge_components: dict, floor: bool = False, min_quantity: float = 0
+    ):
+        """
+        Yield recipes that can be cooked from fridge components one by one.
+        Whole matrix is computed at once, so this is for interface parity with index.
+
+        :param fridge_components: dict of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: iterator of Recipe records in db order.
+        """
+        return iter(self.match(fridge_components, floor, min_quantity))
+
+    def match_many(
+        self, fridges: list, floor: bool = False, min_quantity: float = 0
+    ) -> list:
+        """
+        Return recipes that can be cooked from each of fridges.
+
+        :param fridges: list of dicts of components and their quantity.
+        :param floor: return whole portions instead of fractional quantity.
+        :param min_quantity: min quantity of returned recipes.
+        :return: list of lists of Recipe records in the order of fridges.
+        """
+        # Limit size of the fridges x entries intermediate arrays
+        chunk_size = max(1, MATRIX_CHUNK_SIZE // max(1, len(self.data)))
+
+        results = []
+        for i in range(0, len(fridges), chunk_size):
+            results += self._match_chunk(
+                fridges[i : i + chunk_size], floor, min_quantity
+            )
+
+        return results
+
+    def _match_chunk(self, fridges: list, floor: bool, min_quantity: float) -> list:
+        available = np.zeros((len(fridges), len(self.component_ids)))
+        present = np.zeros((len(fridges), len(self.component_ids)), dtype=bool)
+
+        for row, fridge_components in enumerate(fridges):
+            for component, quantity in fridge_components.items():
+                component_id = self.component_ids.get(component)
+
+                if component_id is not None:
+                    available[row, component_id] = quantity
+                    present[row, component_id] = True
+
+        if not len(self.starts):
+            return [[] for _ in fridges]
+
+        # Recipe is possible if all its components are present
+        feasible = np.logical_and.reduceat(
+            present[:, self.indices], self.starts, axis=1
+        )
+        quantity = np.minimum.reduceat(
+            available[:, self.indices] / self.data, self.starts, axis=1
+        )
+
+        if floor:
+            quantity = np.floor(quantity)
+        feasible &= quantity >= min_quantity
+
+        results = []
+        for row in range(len(fridges)):
+            results.append(
+                [
+                    Recipe(
+                        int(self.recipe_ids[x]),
+                        (int if floor else float)(quantity[row, x]),
+                    )
+                    for x in np.flatnonzero(feasible[row])
+                ]
+            )
+
+        return results
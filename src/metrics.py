@@ -0,0 +1,272 @@
+"""
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+import os
+import re
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from data.config import METRICS_BUCKETS
+
+REQUESTS = "recipe_service_requests_total"
+REQUEST_DURATION = "recipe_service_request_duration_seconds"
+STAGE_DURATION = "recipe_service_stage_duration_seconds"
+QUERY_DURATION = "recipe_service_db_query_duration_seconds"
+CACHE_HITS = "recipe_service_result_cache_hits_total"
+CACHE_MISSES = "recipe_service_result_cache_misses_total"
+CACHE_HIT_RATIO = "recipe_service_result_cache_hit_ratio"
+CACHE_ENTRIES = "recipe_service_result_cache_entries"
+STARTUP_DURATION = "recipe_service_startup_seconds"
+
+# Type and description of every metric
+METRICS = {
+    REQUESTS: ("counter", "Number of handled requests."),
+    REQUEST_DURATION: ("histogram", "Time of handling requests."),
+    STAGE_DURATION: ("histogram", "Time spent in stages of handling requests."),
+    QUERY_DURATION: ("histogram", "Number and time of db queries."),
+    CACHE_HITS: ("counter", "Number of matching results found in cache."),
+    CACHE_MISSES: ("counter", "Number of matching results not found in cache."),
+    CACHE_HIT_RATIO: ("gauge", "Share of matching results found in cache."),
+    CACHE_ENTRIES: ("gauge", "Number of matching results in cache."),
+    STARTUP_DURATION: ("gauge", "Time from start of the process to startup stages."),
+}
+
+# Start of the process where the operating system doesn't report it
+_imported = perf_counter()
+
+# Lists of placeholders, so that IN queries of any length are one metric
+PLACEHOLDERS = re.compile(r"\?(\s*,\s*\?)+")
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms, rendered in Prometheus text format.
+
+    Series are identified by metric name and label values in the order they are given.
+    """
+
+    def __init__(self, buckets: tuple = METRICS_BUCKETS) -> None:
+        """
+        :param buckets: upper bounds of histogram buckets in seconds.
+        """
+        self.buckets = buckets
+
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [count of every bucket, sum]
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increase counter.
+
+        :param name: name of the metric.
+        :param value: increment.
+        :param labels: labels of the series.
+        """
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        Set gauge.
+
+        :param name: name of the metric.
+        :param value: current value.
+        :param labels: labels of the series.
+        """
+        self.gauges[(name, tuple(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Add value to histogram.
+
+        :param name: name of the metric.
+        :param value: observed value.
+        :param labels: labels of the series.
+        """
+        key = (name, tuple(labels.items()))
+
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Add duration of the block to histogram.
+
+        :param name: name of the metric.
+        :param labels: labels of the series.
+        """
+        started = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - started, **labels)
+
+    def clear(self) -> None:
+        """
+        Remove all series.
+        """
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+
+    def render(self) -> str:
+        """
+        Render all series in Prometheus text format.
+
+        :return: text of metrics.
+        """
+        series = {}
+
+        for (name, labels), value in self.counters.items():
+            series.setdefault(name, []).append(format_sample(name, labels, value))
+
+        for (name, labels), value in self.gauges.items():
+            series.setdefault(name, []).append(format_sample(name, labels, value))
+
+        for (name, labels), histogram in self.histograms.items():
+            samples = series.setdefault(name, [])
+
+            count = 0
+            for upper_bound, bucket_count in zip(self.buckets, histogram):
+                count += bucket_count
+                samples.append(
+                    format_sample(
+                        name + "_bucket", labels + (("le", str(upper_bound)),), count
+                    )
+                )
+
+            count += histogram[-2]
+            samples.append(
+                format_sample(name + "_bucket", labels + (("le", "+Inf"),), count)
+            )
+            samples.append(format_sample(name + "_sum", labels, histogram[-1]))
+            samples.append(format_sample(name + "_count", labels, count))
+
+        lines = []
+        for name in sorted(series):
+            metric_type, description = METRICS.get(name, ("untyped", ""))
+
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            lines += series[name]
+
+        return "\n".join(lines) + "\n"
+
+
+def format_sample(name: str, labels: tuple, value: float) -> str:
+    """
+    Format one sample of a series.
+
+    :param name: name of the sample.
+    :param labels: tuple of (label, value) pairs.
+    :param value: value of the sample.
+    :return: line of text format.
+    """
+    if not labels:
+        return "{} {}".format(name, value)
+
+    return "{}{{{}}} {}".format(
+        name,
+        ",".join('{}="{}"'.format(k, escape_label_value(v)) for k, v in labels),
+        value,
+    )
+
+
+def escape_label_value(value) -> str:
+    """
+    Escape label value for text format.
+
+    :param value: value of label.
+    :return: escaped string.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@lru_cache(maxsize=1024)
+def get_query_label(query: str) -> str:
+    """
+    Get label of query, the same for IN lists of any length.
+
+    :param query: query text.
+    :return: label of query.
+    """
+    return PLACEHOLDERS.sub("?, ...", " ".join(query.split()))
+
+
+def get_process_uptime() -> float:
+    """
+    Get time since start of the process, or since import of the module
+    where the operating system doesn't report it.
+
+    :return: time in seconds.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Start time of the process in clock ticks since boot, name may contain spaces
+            started = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+
+        # Both are known to hundredths of a second at best
+        return round(uptime - started / os.sysconf("SC_CLK_TCK"), 2)
+    except (OSError, ValueError, IndexError):
+        return perf_counter() - _imported
+
+
+def _reset_imported() -> None:
+    # Forked process starts at fork, not at import in its parent
+    global _imported
+
+    _imported = perf_counter()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_imported)
+
+
+metrics = Metrics()
+
+
+def record_startup(stage: str):
+    """
+    Record time from start of the process to a startup stage, once per stage.
+
+    :param stage: name of the stage.
+    :return: time in seconds or None if the stage was already recorded.
+    """
+    key = (STARTUP_DURATION, (("stage", stage),))
+
+    if key in metrics.gauges:
+        return None
+
+    duration = metrics.gauges[key] = get_process_uptime()
+
+    return duration
+
+
+def time_stage(stage: str):
+    """
+    Time a stage of handling request.
+
+    :param stage: name of the stage.
+    """
+    return metrics.timer(STAGE_DURATION, stage=stage)
+
+
+def time_query(query: str):
+    """
+    Count and time a db query.
+
+    :param query: query text.
+    """
+    return metrics.timer(QUERY_DURATION, query=get_query_label(query))
@@ -1,40 +1,54 @@
-import json
+import asyncio
+import heapq
 
+from logging import DEBUG
 from time import time
 from pathlib import Path
 
+from src.codec import loads, JSONDecodeError
 from src.exceptions import JSONValidationError
-from src.db import get_query_results, execute_query
+from src.db import get_query_results
+from src.executor import match, match_many, iter_match
+from src.index import get_recipe_index
+from src.stats import locked_stats_buffer, record_stats
+from src.metrics import time_stage
 from src.log import logger
-from data.config import DB_PATH
+from data.config import DB_PATH, STREAM_CHUNK_SIZE
 
 
-async def process_payload(payload: str, db_path: Path = DB_PATH) -> dict:
+def check_fridge(data, components) -> None:
     """
-    Receive a string payload and return a json or an JSONValidationError exception.
+    Check that data is a dictionary of known components and their integer quantities.
+    Raises AssertionError otherwise.
+
+    :param data: decoded json.
+    :param components: names of known components.
+    """
+    # Check correct data format
+    assert isinstance(data, dict)
+
+    # Check that ingredients are in db
+    for key, value in data.items():
+        assert key in components
+        assert isinstance(value, int)
+
+
+async def process_payload(payload: bytes, db_path: Path = DB_PATH) -> dict:
+    """
+    Receive a payload and return a json or an JSONValidationError exception.
     Payload should be a valid JSON and a dictionary.
 
-    :param payload: stringified json.
+    :param payload: json as bytes or str.
     :param db_path: path to database.
     :return: payload json.
     """
     try:
-        data = json.loads(payload)
+        data = loads(payload)
         logger.debug("Successfully decoded components JSON.")
 
-        # Check correct data format
-        assert isinstance(data, dict)
-        logger.debug("Components JSON is a valid object type.")
-
-        # Check that ingredients are in db
-        components = await get_query_results("SELECT component FROM components")
-        components_list = [x[0] for x in components]
-
-        for key, value in data.items():
-            assert key in components_list
-            assert isinstance(value, int)
+        check_fridge(data, get_recipe_index(db_path).components)
         logger.debug("Components JSON contains valid data.")
-    except json.JSONDecodeError:
+    except JSONDecodeError:
         logger.debug("Failed to decode components JSON.")
         raise JSONValidationError(message="Failed to decode JSON.")
     except AssertionError:
@@ -44,76 +58,244 @@ async def process_payload(payload: str, db_path: Path = DB_PATH) -> dict:
     return data
 
 
+async def process_batch_payload(
+    payload: bytes, ndjson: bool = False, db_path: Path = DB_PATH
+) -> list:
+    """
+    Receive a payload with many fridges and return a list of them
+    or an JSONValidationError exception.
+    Payload should be a JSON array or newline delimited JSON of dictionaries.
+
+    :param payload: json or ndjson as bytes or str.
+    :param ndjson: payload is newline delimited JSON.
+    :param db_path: path to database.
+    :return: list of payload jsons.
+    """
+    try:
+        if ndjson:
+            data = [loads(x) for x in payload.splitlines() if x.strip()]
+        else:
+            data = loads(payload)
+            assert isinstance(data, list)
+        logger.debug("Successfully decoded batch of %s fridges.", len(data))
+    except JSONDecodeError:
+        logger.debug("Failed to decode batch JSON.")
+        raise JSONValidationError(message="Failed to decode JSON.")
+    except AssertionError:
+        logger.debug("Batch JSON is not an array.")
+        raise JSONValidationError(message="JSON contains invalid data.")
+
+    components = get_recipe_index(db_path).components
+
+    for i, fridge_components in enumerate(data):
+        try:
+            check_fridge(fridge_components, components)
+        except AssertionError:
+            logger.debug("Fridge %s of batch contains invalid data.", i)
+            raise JSONValidationError(message="JSON contains invalid data.", index=i)
+    logger.debug("Batch JSON contains valid data.")
+
+    return data
+
+
 async def get_recipes_from_components(
-    fridge_components: dict, db_path: Path = DB_PATH
+    fridge_components: dict,
+    floor: bool = False,
+    min_quantity: float = 0,
+    db_path: Path = DB_PATH,
 ) -> list:
     """
     Return possible recipes and the quantity that can be cooked from components list.
 
     :param fridge_components: dict of components and their quantity.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
     :param db_path: path to database.
     :return: list of recipes.
     """
     available_components = set(fridge_components.keys())
-    logger.debug("Available components: {}".format(available_components))
-
-    # Updated counters of users' components
-    for component in available_components:
-        await execute_query(
-            "UPDATE components SET total_encountered = 1 + "
-            "(SELECT total_encountered FROM components WHERE component = ?) "
-            "WHERE component = ?",
-            (component, component),
-            db_path=db_path,
+
+    # Select recipes that are possible to prepare with users' components
+    index = get_recipe_index(db_path)
+    options = (floor, min_quantity)
+
+    with time_stage("matching"):
+        selected_recipes = index.result_cache.get(fridge_components, options)
+        if selected_recipes is None:
+            selected_recipes = await match(
+                fridge_components, db_path, floor=floor, min_quantity=min_quantity
+            )
+
+            # Records refer to the index that is current once matching is done
+            index = get_recipe_index(db_path)
+            index.result_cache.put(fridge_components, selected_recipes, options)
+
+    with time_stage("serialization"):
+        selected_recipes = index.get_recipes(selected_recipes)
+
+    selected_recipes_names = [x["name"] for x in selected_recipes]
+
+    # Update counters of users' components and last recommended time for recipes
+    current_time = int(time())
+
+    with time_stage("stats"):
+        await record_stats(
+            available_components, selected_recipes_names, current_time, db_path=db_path
         )
-    logger.debug("Updated component counters of: {}".format(available_components))
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("Updated component counters of: %s", available_components)
+        logger.debug("Updated last recommended times of: %s", selected_recipes_names)
 
-    recipes = await get_query_results(
-        "SELECT recipe_name, components FROM recipes", db_path=db_path
-    )
+    return selected_recipes
 
-    # Select recipes that are possible to prepare with users' components
+
+async def iter_recipes_from_components(
+    fridge_components: dict,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    floor: bool = False,
+    min_quantity: float = 0,
+    db_path: Path = DB_PATH,
+):
+    """
+    Yield possible recipes and the quantity that can be cooked from components list
+    as they are matched, returning control to the event loop every chunk_size recipes.
+    Statistics are recorded once all recipes are yielded.
+
+    :param fridge_components: dict of components and their quantity.
+    :param chunk_size: number of recipes between returns to the event loop.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :param db_path: path to database.
+    :return: async generator of recipes.
+    """
+    available_components = set(fridge_components.keys())
+
+    index = get_recipe_index(db_path)
+    options = (floor, min_quantity)
+
+    cached_recipes = index.result_cache.get(fridge_components, options)
+    if cached_recipes is not None:
+        recipes = iter(cached_recipes)
+    else:
+        recipes = await iter_match(
+            fridge_components, db_path, floor=floor, min_quantity=min_quantity
+        )
+        index = get_recipe_index(db_path)
+
+    names = index.recipe_names
     selected_recipes = []
+
     for recipe in recipes:
-        recipe_components = json.loads(recipe[1])
-        recipe_components_names = set([x["item"] for x in recipe_components])
-        logger.debug(
-            "Recipe '{}' contains '{}'".format(recipe[0], recipe_components_names)
+        selected_recipes.append(recipe)
+
+        yield {"name": names[recipe.recipe_id], "quantity": recipe.quantity}
+
+        if not len(selected_recipes) % chunk_size:
+            await asyncio.sleep(0)
+
+    if cached_recipes is None:
+        index.result_cache.put(fridge_components, selected_recipes, options)
+
+    selected_recipes_names = [names[x.recipe_id] for x in selected_recipes]
+
+    current_time = int(time())
+
+    with time_stage("stats"):
+        await record_stats(
+            available_components, selected_recipes_names, current_time, db_path=db_path
         )
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("Updated component counters of: %s", available_components)
+        logger.debug("Updated last recommended times of: %s", selected_recipes_names)
+
+
+async def get_recipes_from_components_batch(
+    fridges: list,
+    floor: bool = False,
+    min_quantity: float = 0,
+    db_path: Path = DB_PATH,
+) -> list:
+    """
+    Return possible recipes for every fridge of a batch,
+    recording statistics of the whole batch at once.
 
-        # If user has all components of the recipe, find minimum amount that can be prepared
-        minimum_quantity = 0
-        if recipe_components_names.issubset(available_components):
-            logger.debug(
-                "Recipe '{}' can be cooked with available components.".format(recipe[0])
+    :param fridges: list of dicts of components and their quantity.
+    :param floor: return whole portions instead of fractional quantity.
+    :param min_quantity: min quantity of returned recipes.
+    :param db_path: path to database.
+    :return: list of lists of recipes in the order of fridges.
+    """
+    index = get_recipe_index(db_path)
+    options = (floor, min_quantity)
+
+    # Match fridges that are not cached all at once
+    with time_stage("matching"):
+        cached_recipes = [index.result_cache.get(x, options) for x in fridges]
+        misses = [i for i, x in enumerate(cached_recipes) if x is None]
+
+        # Names are taken from the index that records refer to
+        batch_recipes = [x and index.get_recipes(x) for x in cached_recipes]
+
+        if misses:
+            matched_recipes = await match_many(
+                [fridges[i] for i in misses],
+                db_path,
+                floor=floor,
+                min_quantity=min_quantity,
             )
+            index = get_recipe_index(db_path)
 
-            for components in recipe_components:
-                available_quantity = fridge_components[components["item"]]
-                needed_quantity = components["q"]
+            for i, recipes in zip(misses, matched_recipes):
+                batch_recipes[i] = index.get_recipes(recipes)
+                index.result_cache.put(fridges[i], recipes, options)
 
-                if minimum_quantity:
-                    minimum_quantity = min(
-                        minimum_quantity, available_quantity / needed_quantity
-                    )
-                else:
-                    # First cycle
-                    minimum_quantity = available_quantity / needed_quantity
+    # Components are counted once per fridge, recipes are stamped once per batch
+    available_components = [x for fridge in fridges for x in fridge]
+    selected_recipes_names = {x["name"] for recipes in batch_recipes for x in recipes}
+
+    current_time = int(time())
+
+    with time_stage("stats"):
+        await record_stats(
+            available_components, selected_recipes_names, current_time, db_path=db_path
+        )
+    logger.debug("Updated statistics of batch of %s fridges.", len(fridges))
 
-            selected_recipes.append({"name": recipe[0], "quantity": minimum_quantity})
+    return batch_recipes
+
+
+async def get_partial_recipes_from_components(
+    fridge_components: dict,
+    max_missing: int = 1,
+    limit: int = 50,
+    db_path: Path = DB_PATH,
+) -> list:
+    """
+    Return recipes that lack at most max_missing components of the fridge
+    with the missing components and the quantity that could be cooked.
+
+    :param fridge_components: dict of components and their quantity.
+    :param max_missing: max number of components that a recipe may lack.
+    :param limit: max number of recipes to return.
+    :param db_path: path to database.
+    :return: list of recipes, the ones that lack fewer components first.
+    """
+    with time_stage("matching"):
+        selected_recipes = get_recipe_index(db_path).match_partial(
+            fridge_components, max_missing, limit
+        )
 
     selected_recipes_names = [x["name"] for x in selected_recipes]
 
-    # Update last recommended time for recipes
-    for recipe_name in selected_recipes_names:
-        current_time = int(time())
+    current_time = int(time())
 
-        await execute_query(
-            "UPDATE recipes SET last_recommended = ? WHERE recipe_name = ?",
-            (current_time, recipe_name),
+    with time_stage("stats"):
+        await record_stats(
+            fridge_components.keys(),
+            selected_recipes_names,
+            current_time,
             db_path=db_path,
         )
-    logger.debug("Updated last recommended times of: {}".format(selected_recipes_names))
 
     return selected_recipes
 
@@ -128,23 +310,57 @@ async def get_last_recommended_recipes(
     :param db_path: path to database.
     :return:
     """
-    recipes = await get_query_results(
-        "SELECT recipe_name, last_recommended FROM recipes", db_path=db_path
-    )
+    cutoff_point = int(time()) - time_period
 
-    current_time = int(time())
-    cutoff_point = current_time - time_period
+    async with locked_stats_buffer(db_path) as buffer:
+        recipes = await get_query_results(
+            "SELECT recipe_name FROM recipes WHERE last_recommended > ? "
+            "ORDER BY recipe_name",
+            (cutoff_point,),
+            db_path=db_path,
+        )
+        recommended_recipes = [x[0] for x in recipes]
 
-    recommended_recipes = []
-    for recipe_name, last_recommended in recipes:
-        if last_recommended > cutoff_point:
-            recommended_recipes.append(recipe_name)
+        # Merge times that are not flushed to db yet
+        if buffer is not None:
+            pending_recipes = [
+                recipe_name
+                for recipe_name, timestamp in buffer.pending_last_recommended().items()
+                if timestamp > cutoff_point
+            ]
 
-    recommended_recipes.sort()
+            if pending_recipes:
+                recommended_recipes = sorted(
+                    set(recommended_recipes).union(pending_recipes)
+                )
 
     return {"last_recommended_recipes": recommended_recipes}
 
 
+async def get_components_counters(components: list, db_path: Path = DB_PATH) -> list:
+    """
+    Return counters of components.
+
+    :param components: names of components.
+    :param db_path: path to database.
+    :return: list of (component, total_encountered).
+    """
+    counters = []
+
+    # Keep number of query parameters under SQLite limit
+    for i in range(0, len(components), 500):
+        chunk = components[i : i + 500]
+
+        counters += await get_query_results(
+            "SELECT component, total_encountered FROM components "
+            "WHERE component IN ({})".format(",".join("?" * len(chunk))),
+            tuple(chunk),
+            db_path=db_path,
+        )
+
+    return counters
+
+
 async def get_most_popular_components(
     number_of_products: int = 10, db_path: Path = DB_PATH
 ) -> dict:
@@ -155,13 +371,34 @@ async def get_most_popular_components(
     :param db_path: path to database.
     :return: list of products.
     """
-    components = await get_query_results("SELECT * FROM components", db_path=db_path)
+    async with locked_stats_buffer(db_path) as buffer:
+        # Sorting by both counter and name from high to low
+        components = await get_query_results(
+            "SELECT component, total_encountered FROM components "
+            "ORDER BY total_encountered DESC, component DESC LIMIT ?",
+            (number_of_products,),
+            db_path=db_path,
+        )
+
+        # Merge counters that are not flushed to db yet.
+        # Only components in db top or with pending increments can make it to the top.
+        if buffer is not None:
+            pending_counts = buffer.pending_component_counts()
+
+            if pending_counts:
+                candidates = dict(components)
+                candidates.update(
+                    await get_components_counters(
+                        [x for x in pending_counts if x not in candidates], db_path
+                    )
+                )
 
-    # Sorting by both counter and name from high to low
-    components.sort(key=lambda x: (x[1], x[0]), reverse=True)
+                components = heapq.nlargest(
+                    number_of_products,
+                    [(x, count + pending_counts[x]) for x, count in candidates.items()],
+                    key=lambda x: (x[1], x[0]),
+                )
 
-    popular_components = [
-        {name: count} for name, count in components[0:number_of_products]
-    ]
+    popular_components = [{name: count} for name, count in components]
 
     return {"most_popular_components": popular_components}
@@ -0,0 +1,228 @@
+import asyncio
+import sqlite3
+
+from pathlib import Path
+
+from src.db import db_create, db_swap, db_remove, get_shadow_path
+from src.index import (
+    RecipeIndex,
+    get_book_version,
+    get_recipe_index,
+    rebuild_recipe_index,
+)
+from src.stats import locked_stats_buffer
+from src.log import logger
+from data.config import (
+    DB_PATH,
+    FILE_PATH,
+    RECIPE_BOOK_WATCH,
+    RECIPE_BOOK_CHECK_INTERVAL,
+)
+
+
+class FileWatch:
+    """
+    Tells if a file was modified since the previous check.
+    """
+
+    def __init__(self, file_path: Path = FILE_PATH) -> None:
+        """
+        :param file_path: path to watched file.
+        """
+        self.file_path = file_path
+        self.state = self._get_state()
+
+    def _get_state(self):
+        try:
+            stat = self.file_path.stat()
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self) -> bool:
+        """
+        Check if file was modified, created or removed since the previous check.
+
+        :return: True if file changed.
+        """
+        state = self._get_state()
+        changed, self.state = state != self.state, state
+
+        return changed
+
+
+_reload_locks = {}
+
+
+async def reload_recipe_book(
+    file_path: Path = FILE_PATH, db_path: Path = DB_PATH
+) -> RecipeIndex:
+    """
+    Replace recipe book in db with the one from text file and rebuild recipe index,
+    keeping statistics and serving requests meanwhile.
+
+    Requests that have already started finish with the old index and result cache.
+
+    :param file_path: path to file with data.
+    :param db_path: path to database.
+    :return: new recipe index.
+    """
+    loop = asyncio.get_event_loop()
+    shadow_path = get_shadow_path(db_path)
+
+    async with _reload_locks.setdefault(db_path, asyncio.Lock()):
+        try:
+            await loop.run_in_executor(None, db_create, file_path, shadow_path)
+
+            # Buffered statistics would wait for the swap, so they are held back
+            async with locked_stats_buffer(db_path):
+                await loop.run_in_executor(None, db_swap, db_path, shadow_path)
+        finally:
+            db_remove(shadow_path)
+
+        index = await loop.run_in_executor(None, rebuild_recipe_index, db_path)
+
+    logger.info("Reloaded recipe book from %s.", file_path)
+
+    return index
+
+
+async def refresh_recipe_index(db_path: Path = DB_PATH) -> bool:
+    """
+    Rebuild recipe index if the recipe book in db was replaced by another process.
+
+    :param db_path: path to database.
+    :return: True if index was rebuilt.
+    """
+    with sqlite3.connect(db_path) as db:
+        version = get_book_version(db)
+
+    if version == get_recipe_index(db_path).version:
+        return False
+
+    async with _reload_locks.setdefault(db_path, asyncio.Lock()):
+        await asyncio.get_event_loop().run_in_executor(
+            None, rebuild_recipe_index, db_path
+        )
+
+    logger.info("Recipe book was replaced, rebuilt recipe index.")
+
+    return True
+
+
+class RecipeBookWatcher:
+    """
+    Background task that keeps recipe index in line with the recipe book:
+    reloads the book when its file changes, if watching of the file is on,
+    and rebuilds the index when the book is reloaded by another process.
+    """
+
+    def __init__(
+        self,
+        file_path: Path = FILE_PATH,
+        db_path: Path = DB_PATH,
+        watch_file: bool = RECIPE_BOOK_WATCH,
+        interval: float = RECIPE_BOOK_CHECK_INTERVAL,
+    ) -> None:
+        """
+        :param file_path: path to file with data.
+        :param db_path: path to database.
+        :param watch_file: reload the book when file changes.
+        :param interval: seconds between checks.
+        """
+        self.file_path = file_path
+        self.db_path = db_path
+        self.interval = interval
+
+        self.file_watch = FileWatch(file_path) if watch_file else None
+
+        self._task = None
+
+    async def check(self) -> None:
+        """
+        Reload the book or rebuild the index if needed.
+        """
+        if (
+            self.file_watch is not None
+            and self.file_watch.changed()
+            and self.file_path.is_file()
+        ):
+            try:
+                await reload_recipe_book(self.file_path, self.db_path)
+            except Exception:
+                # File may be still being written, so it is retried on the next check
+                self.file_watch.state = None
+                raise
+        else:
+            await refresh_recipe_index(self.db_path)
+
+    async def run(self) -> None:
+        """
+        Check the book periodically.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Failed to check recipe book.")
+
+    def start(self) -> None:
+        """
+        Start background checking task.
+        """
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop background checking task.
+        """
+        if self._task is not None:
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+
+_watchers = {}
+
+
+def start_recipe_book_watcher(
+    file_path: Path = FILE_PATH,
+    db_path: Path = DB_PATH,
+    watch_file: bool = RECIPE_BOOK_WATCH,
+    interval: float = RECIPE_BOOK_CHECK_INTERVAL,
+) -> RecipeBookWatcher:
+    """
+    Start checking the recipe book of the database in background.
+
+    :param file_path: path to file with data.
+    :param db_path: path to database.
+    :param watch_file: reload the book when file changes.
+    :param interval: seconds between checks.
+    :return: recipe book watcher.
+    """
+    watcher = RecipeBookWatcher(file_path, db_path, watch_file, interval)
+    watcher.start()
+
+    _watchers[db_path] = watcher
+
+    return watcher
+
+
+async def stop_recipe_book_watcher(db_path: Path = DB_PATH) -> None:
+    """
+    Stop checking the recipe book of the database.
+
+    :param db_path: path to database.
+    """
+    watcher = _watchers.pop(db_path, None)
+
+    if watcher is not None:
+        await watcher.stop()
@@ -0,0 +1,362 @@
+"""
+https://docs.python.org/3/library/mmap.html
+"""
+import argparse
+import mmap
+import os
+import sqlite3
+import struct
+
+from array import array
+from pathlib import Path
+
+from src.index import RecipeIndex, get_book_version
+from src.symbols import SymbolTable
+from src.log import logger
+from data.config import DB_PATH
+
+MAGIC = b"RCPSNAP\x00"
+FORMAT_VERSION = 1
+# Written in native byte order, so that snapshots of another byte order are rejected
+BYTE_ORDER_MARK = 0x01020304
+
+# Magic, format version, byte order mark, book version, number of recipes,
+# components and entries, sizes of encoded recipe and component names
+HEADER = struct.Struct("=8sIIqIIIII")
+
+# Array sections in file order and type codes of their items
+SECTIONS = (
+    ("offsets", "I"),
+    ("required_counts", "I"),
+    ("entry_components", "I"),
+    ("entry_quantities", "d"),
+    ("posting_offsets", "I"),
+    ("posting_recipes", "I"),
+    ("recipe_name_offsets", "I"),
+    ("component_name_offsets", "I"),
+)
+
+# Sections start at multiples of it, so that casted arrays are aligned
+ALIGNMENT = 8
+
+
+class MappedNames:
+    """
+    Read-only sequence of names encoded one after another in a snapshot,
+    decoded on access.
+    """
+
+    __slots__ = ("offsets", "data")
+
+    def __init__(self, offsets: memoryview, data: memoryview) -> None:
+        """
+        :param offsets: starts of names in data and end of the last one.
+        :param data: UTF-8 encoded names.
+        """
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < len(self.offsets) - 1:
+            raise IndexError("Name index out of range.")
+
+        return str(self.data[self.offsets[i] : self.offsets[i + 1]], "utf-8")
+
+
+class MappedPostings:
+    """
+    Read-only sequence of recipe ids of every component in a snapshot.
+    """
+
+    __slots__ = ("offsets", "recipe_ids")
+
+    def __init__(self, offsets: memoryview, recipe_ids: memoryview) -> None:
+        """
+        :param offsets: starts of recipe ids of every component and end of the last.
+        :param recipe_ids: recipe ids of all components.
+        """
+        self.offsets = offsets
+        self.recipe_ids = recipe_ids
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> memoryview:
+        if not 0 <= i < len(self.offsets) - 1:
+            raise IndexError("Component index out of range.")
+
+        return self.recipe_ids[self.offsets[i] : self.offsets[i + 1]]
+
+
+def get_section_lengths(recipes: int, components: int, entries: int) -> tuple:
+    """
+    Get number of items in every array section.
+
+    :param recipes: number of recipes.
+    :param components: number of components.
+    :param entries: number of components of all recipes.
+    :return: tuple of lengths in the order of sections.
+    """
+    return (
+        recipes + 1,
+        recipes,
+        entries,
+        entries,
+        components + 1,
+        entries,
+        recipes + 1,
+        components + 1,
+    )
+
+
+def get_snapshot_path(db_path: Path = DB_PATH) -> Path:
+    """
+    Get path of the snapshot of the recipe book of db.
+
+    :param db_path: path to database.
+    :return: path to snapshot.
+    """
+    return db_path.with_name(db_path.name + ".snapshot")
+
+
+def encode_names(names) -> tuple:
+    """
+    Encode names one after another.
+
+    :param names: sequence of names.
+    :return: tuple of array of offsets and encoded names.
+    """
+    offsets = array("I", [0])
+    data = bytearray()
+
+    for name in names:
+        data += name.encode("utf-8")
+        offsets.append(len(data))
+
+    return offsets, data
+
+
+def write_snapshot(index: RecipeIndex, snapshot_path: Path) -> None:
+    """
+    Write recipe index to snapshot file. File is replaced at once,
+    so that processes that mapped the old one keep reading it.
+
+    :param index: recipe index.
+    :param snapshot_path: path to snapshot.
+    """
+    posting_offsets = array("I", [0])
+    posting_recipes = array("I")
+
+    for recipe_ids in index.by_component:
+        posting_recipes.extend(recipe_ids)
+        posting_offsets.append(len(posting_recipes))
+
+    recipe_name_offsets, recipe_names = encode_names(index.recipe_names)
+    component_name_offsets, component_names = encode_names(
+        index.component_symbols.names
+    )
+
+    sections = {
+        "offsets": index.offsets,
+        "required_counts": index.required_counts,
+        "entry_components": index.entry_components,
+        "entry_quantities": index.entry_quantities,
+        "posting_offsets": posting_offsets,
+        "posting_recipes": posting_recipes,
+        "recipe_name_offsets": recipe_name_offsets,
+        "component_name_offsets": component_name_offsets,
+    }
+
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        BYTE_ORDER_MARK,
+        index.version,
+        len(index.recipe_names),
+        len(index.component_symbols),
+        len(index.entry_components),
+        len(recipe_names),
+        len(component_names),
+    )
+
+    temporary_path = snapshot_path.with_name(
+        "{}.{}.tmp".format(snapshot_path.name, os.getpid())
+    )
+
+    try:
+        with temporary_path.open("wb") as f:
+            f.write(header)
+
+            for data in [sections[x[0]] for x in SECTIONS]:
+                f.write(b"\0" * (-f.tell() % ALIGNMENT))
+                f.write(data)
+
+            f.write(recipe_names)
+            f.write(component_names)
+
+        os.replace(temporary_path, snapshot_path)
+    finally:
+        if temporary_path.is_file():
+            temporary_path.unlink()
+
+    logger.debug("Wrote snapshot of recipe book to %s.", snapshot_path)
+
+
+def read_header(data) -> tuple:
+    """
+    Read and check header of snapshot.
+    Raises ValueError if data is not a snapshot of this format.
+
+    :param data: bytes-like contents of snapshot.
+    :return: tuple of book version, number of recipes, components, entries
+        and sizes of encoded recipe and component names.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Snapshot is truncated.")
+
+    magic, format_version, byte_order_mark, *counts = HEADER.unpack_from(data)
+
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError("File is not a snapshot of supported format.")
+    if byte_order_mark != BYTE_ORDER_MARK:
+        raise ValueError("Snapshot was written with another byte order.")
+
+    return tuple(counts)
+
+
+def read_snapshot_version(snapshot_path: Path) -> int:
+    """
+    Read version of the recipe book that snapshot was written from.
+
+    :param snapshot_path: path to snapshot.
+    :return: book version.
+    """
+    with snapshot_path.open("rb") as f:
+        return read_header(f.read(HEADER.size))[0]
+
+
+def read_snapshot(snapshot_path: Path) -> RecipeIndex:
+    """
+    Map snapshot into memory and build recipe index over it.
+    Arrays are views of the mapping, so they are neither parsed nor copied,
+    and processes that read the same snapshot share its pages.
+
+    :param snapshot_path: path to snapshot.
+    :return: recipe index.
+    """
+    with snapshot_path.open("rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapping)
+
+    (
+        version,
+        recipe_count,
+        component_count,
+        entry_count,
+        recipe_names_size,
+        component_names_size,
+    ) = read_header(view)
+
+    lengths = get_section_lengths(recipe_count, component_count, entry_count)
+
+    sections = {}
+    position = HEADER.size
+
+    for (name, type_code), length in zip(SECTIONS, lengths):
+        position += -position % ALIGNMENT
+        size = length * array(type_code).itemsize
+
+        if position + size > len(view):
+            raise ValueError("Snapshot is truncated.")
+
+        sections[name] = view[position : position + size].cast(type_code)
+        position += size
+
+    if position + recipe_names_size + component_names_size > len(view):
+        raise ValueError("Snapshot is truncated.")
+
+    recipe_names = view[position : position + recipe_names_size]
+    position += recipe_names_size
+    component_names = view[position : position + component_names_size]
+
+    index = RecipeIndex([], version=version)
+    index.recipe_symbols = SymbolTable.from_names(
+        MappedNames(sections["recipe_name_offsets"], recipe_names)
+    )
+    index.component_symbols = SymbolTable.from_names(
+        MappedNames(sections["component_name_offsets"], component_names)
+    )
+    index.offsets = sections["offsets"]
+    index.required_counts = sections["required_counts"]
+    index.entry_components = sections["entry_components"]
+    index.entry_quantities = sections["entry_quantities"]
+    index.by_component = MappedPostings(
+        sections["posting_offsets"], sections["posting_recipes"]
+    )
+
+    return index
+
+
+def remove_snapshot(db_path: Path = DB_PATH) -> None:
+    """
+    Remove snapshot of db if it exists.
+
+    :param db_path: path to database.
+    """
+    snapshot_path = get_snapshot_path(db_path)
+
+    if snapshot_path.is_file():
+        snapshot_path.unlink()
+
+
+def db_snapshot(db_path: Path = DB_PATH) -> RecipeIndex:
+    """
+    Write snapshot of the recipe book of db next to it.
+
+    :param db_path: path to database.
+    :return: recipe index that snapshot was written from.
+    """
+    index = RecipeIndex.from_db(db_path)
+    write_snapshot(index, get_snapshot_path(db_path))
+
+    return index
+
+
+def load_recipe_index(db_path: Path = DB_PATH) -> RecipeIndex:
+    """
+    Get recipe index of db from its snapshot, writing the snapshot first
+    if there is none or it was written from another version of the book.
+
+    :param db_path: path to database.
+    :return: recipe index over mapped snapshot.
+    """
+    snapshot_path = get_snapshot_path(db_path)
+
+    with sqlite3.connect(db_path) as db:
+        version = get_book_version(db)
+
+    try:
+        if read_snapshot_version(snapshot_path) == version:
+            return read_snapshot(snapshot_path)
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        logger.warning("Snapshot %s is invalid, it is rewritten.", snapshot_path)
+
+    db_snapshot(db_path)
+
+    return read_snapshot(snapshot_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write snapshot of recipe book of db next to it."
+    )
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Path to database.")
+    args = parser.parse_args()
+
+    db_snapshot(args.db)
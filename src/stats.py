@@ -0,0 +1,278 @@
+import asyncio
+
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from src.db import execute_transaction
+from src.log import logger
+from data.config import DB_PATH, STATS_FLUSH_INTERVAL, STATS_FLUSH_SIZE
+
+
+async def write_stats(
+    component_counts: dict, last_recommended: dict, db_path: Path = DB_PATH
+) -> None:
+    """
+    Add component counters and last recommended times to db in one transaction.
+
+    :param component_counts: dict of components and increments of their counters.
+    :param last_recommended: dict of recipes and their last recommended time.
+    :param db_path: path to database.
+    """
+    await execute_transaction(
+        [
+            (
+                "UPDATE components SET total_encountered = total_encountered + ? "
+                "WHERE component = ?",
+                [(count, name) for name, count in component_counts.items()],
+            ),
+            (
+                "UPDATE recipes SET last_recommended = MAX(last_recommended, ?) "
+                "WHERE recipe_name = ?",
+                [(timestamp, name) for name, timestamp in last_recommended.items()],
+            ),
+        ],
+        db_path=db_path,
+    )
+
+
+class StatsBuffer:
+    """
+    Write-behind buffer of component counters and last recommended times.
+
+    Statistics are aggregated in memory and flushed to db by a background task
+    every flush_interval seconds or once flush_size entries are accumulated.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        flush_interval: float = STATS_FLUSH_INTERVAL,
+        flush_size: int = STATS_FLUSH_SIZE,
+    ) -> None:
+        """
+        :param db_path: path to database.
+        :param flush_interval: seconds between flushes.
+        :param flush_size: number of buffered entries that triggers a flush.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self.component_counts = Counter()
+        self.last_recommended = {}
+
+        # Entries that are being written and are not committed yet
+        self._flushing = (Counter(), {})
+
+        # Held while flushing, so that readers never see entries both in db and here
+        self.lock = asyncio.Lock()
+
+        self._flush_needed = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self.component_counts) + len(self.last_recommended)
+
+    def add(self, components, recipe_names, timestamp: int) -> None:
+        """
+        Add statistics of one request to the buffer.
+
+        :param components: components in user's fridge.
+        :param recipe_names: names of recommended recipes.
+        :param timestamp: unix time of the recommendation.
+        """
+        self._merge(Counter(components), {x: timestamp for x in recipe_names})
+
+        if len(self) >= self.flush_size:
+            self._flush_needed.set()
+
+    def _merge(self, component_counts: Counter, last_recommended: dict) -> None:
+        self.component_counts.update(component_counts)
+
+        for recipe_name, timestamp in last_recommended.items():
+            self.last_recommended[recipe_name] = max(
+                self.last_recommended.get(recipe_name, 0), timestamp
+            )
+
+    def pending_component_counts(self) -> Counter:
+        """
+        Return counter increments that are not in db yet.
+        """
+        return self.component_counts + self._flushing[0]
+
+    def pending_last_recommended(self) -> dict:
+        """
+        Return last recommended times that are not in db yet.
+        """
+        last_recommended = dict(self._flushing[1])
+
+        for recipe_name, timestamp in self.last_recommended.items():
+            last_recommended[recipe_name] = max(
+                last_recommended.get(recipe_name, 0), timestamp
+            )
+
+        return last_recommended
+
+    async def flush(self) -> None:
+        """
+        Write buffered statistics to db.
+        If writing fails, statistics are returned to the buffer.
+        """
+        async with self.lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not len(self):
+            return
+
+        self._flushing = (self.component_counts, self.last_recommended)
+        self.component_counts, self.last_recommended = Counter(), {}
+
+        component_counts, last_recommended = self._flushing
+
+        try:
+            await write_stats(component_counts, last_recommended, self.db_path)
+        except BaseException:
+            # Also on cancellation, so that entries are not lost with the batch
+            self._merge(component_counts, last_recommended)
+            raise
+        finally:
+            self._flushing = (Counter(), {})
+
+        logger.debug(
+            "Flushed statistics of %s components and %s recipes.",
+            len(component_counts),
+            len(last_recommended),
+        )
+
+    async def run(self) -> None:
+        """
+        Flush statistics periodically or when the buffer is full, until stopped.
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_needed.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush statistics.")
+
+    def start(self) -> None:
+        """
+        Start background flushing task.
+        """
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop background flushing task and flush what is left.
+        A flush in progress is waited for instead of being cancelled mid-write.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._flush_needed.set()
+
+            await self._task
+
+            self._task = None
+            self._stopping = False
+
+        await self.flush()
+
+
+_buffers = {}
+
+
+def get_stats_buffer(db_path: Path = DB_PATH):
+    """
+    Get write-behind buffer of the database.
+
+    :param db_path: path to database.
+    :return: stats buffer or None if write-behind mode is off.
+    """
+    return _buffers.get(db_path)
+
+
+def start_write_behind(
+    db_path: Path = DB_PATH,
+    flush_interval: float = STATS_FLUSH_INTERVAL,
+    flush_size: int = STATS_FLUSH_SIZE,
+) -> StatsBuffer:
+    """
+    Turn on write-behind mode for the database.
+
+    :param db_path: path to database.
+    :param flush_interval: seconds between flushes.
+    :param flush_size: number of buffered entries that triggers a flush.
+    :return: stats buffer.
+    """
+    buffer = StatsBuffer(db_path, flush_interval, flush_size)
+    buffer.start()
+
+    _buffers[db_path] = buffer
+
+    logger.debug("Started write-behind of statistics.")
+
+    return buffer
+
+
+@asynccontextmanager
+async def locked_stats_buffer(db_path: Path = DB_PATH):
+    """
+    Get write-behind buffer of the database and keep it from flushing,
+    so that db reads can be merged with unflushed statistics exactly.
+
+    :param db_path: path to database.
+    """
+    buffer = get_stats_buffer(db_path)
+
+    if buffer is None:
+        yield None
+    else:
+        async with buffer.lock:
+            yield buffer
+
+
+async def stop_write_behind(db_path: Path = DB_PATH) -> None:
+    """
+    Turn off write-behind mode for the database, flushing buffered statistics.
+
+    :param db_path: path to database.
+    """
+    buffer = _buffers.pop(db_path, None)
+
+    if buffer is not None:
+        await buffer.stop()
+
+        logger.debug("Stopped write-behind of statistics.")
+
+
+async def record_stats(
+    components, recipe_names, timestamp: int, db_path: Path = DB_PATH
+) -> None:
+    """
+    Record statistics of one request: buffer them in write-behind mode
+    or write them to db right away otherwise.
+
+    :param components: components in user's fridge.
+    :param recipe_names: names of recommended recipes.
+    :param timestamp: unix time of the recommendation.
+    :param db_path: path to database.
+    """
+    buffer = get_stats_buffer(db_path)
+
+    if buffer is not None:
+        buffer.add(components, recipe_names, timestamp)
+    else:
+        await write_stats(
+            Counter(components),
+            {x: timestamp for x in recipe_names},
+            db_path=db_path,
+        )
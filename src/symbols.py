@@ -0,0 +1,122 @@
+import sys
+
+
+class SymbolTable:
+    """
+    Names and their dense integer ids, in the order names were added.
+
+    Every name is stored once and interned, so that structures that refer to it
+    hold small integers instead of copies of long strings.
+    """
+
+    __slots__ = ("names", "_ids")
+
+    def __init__(self, names=()) -> None:
+        """
+        :param names: names to add.
+        """
+        self.names = []
+        self._ids = {}
+
+        for name in names:
+            self.add(name)
+
+    @classmethod
+    def from_names(cls, names) -> "SymbolTable":
+        """
+        Create table over a sequence of distinct names without copying it.
+        Ids of names are looked up on first use.
+
+        :param names: sequence of names, their ids are their positions.
+        :return: symbol table.
+        """
+        table = cls()
+        table.names = names
+        table._ids = None
+
+        return table
+
+    @property
+    def ids(self) -> dict:
+        """
+        Dict of names and their ids.
+        """
+        if self._ids is None:
+            self._ids = {sys.intern(x): i for i, x in enumerate(self.names)}
+
+        return self._ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def add(self, name: str) -> int:
+        """
+        Add name if it is not in the table yet.
+
+        :param name: name to add.
+        :return: id of the name.
+        """
+        ids = self.ids
+        symbol_id = ids.get(name)
+
+        if symbol_id is None:
+            name = sys.intern(name)
+            symbol_id = ids[name] = len(self.names)
+            self.names.append(name)
+
+        return symbol_id
+
+    def get_id(self, name: str, default=None):
+        """
+        Get id of name.
+
+        :param name: name to look up.
+        :param default: value returned if name is not in the table.
+        :return: id of the name or default.
+        """
+        return self.ids.get(name, default)
+
+    def get_name(self, symbol_id: int) -> str:
+        """
+        Get name of id.
+
+        :param symbol_id: id to look up.
+        :return: name.
+        """
+        return self.names[symbol_id]
+
+
+class Recipe:
+    """
+    Recipe that can be cooked: id of the recipe in its index and quantity.
+    Name is looked up only when the result is returned to a client.
+    """
+
+    __slots__ = ("recipe_id", "quantity")
+
+    def __init__(self, recipe_id: int, quantity: float) -> None:
+        """
+        :param recipe_id: id of the recipe in symbol table of its index.
+        :param quantity: number of portions that can be cooked.
+        """
+        self.recipe_id = recipe_id
+        self.quantity = quantity
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Recipe):
+            return NotImplemented
+
+        return self.recipe_id == other.recipe_id and self.quantity == other.quantity
+
+    def __repr__(self) -> str:
+        return "Recipe({!r}, {!r})".format(self.recipe_id, self.quantity)
+
+    def __reduce__(self):
+        # Compact pickles for results of worker processes
+        return Recipe, (self.recipe_id, self.quantity)
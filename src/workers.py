@@ -0,0 +1,158 @@
+import multiprocessing
+import signal
+import socket
+import time
+
+from src.log import logger, stop_queue_listeners
+from data.config import WORKERS_CHECK_INTERVAL, WORKERS_SHUTDOWN_TIMEOUT
+
+
+def create_listening_socket(host: str, port: int, backlog: int = 128) -> socket.socket:
+    """
+    Bind listening socket that forked workers share.
+
+    :param host: address of the server.
+    :param port: port of the server.
+    :param backlog: size of the queue of pending connections.
+    :return: bound socket.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+
+    return sock
+
+
+def run_worker(target) -> None:
+    """
+    Run target in a worker process with default signal handlers,
+    so that the supervisor's handlers don't intercept its signals.
+
+    :param target: function that serves requests.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    try:
+        target()
+    finally:
+        # Worker exits without running atexit, so logs left in queues are written now
+        stop_queue_listeners()
+
+
+class Supervisor:
+    """
+    Keeps a number of forked worker processes running, restarting those that die,
+    and shuts them down gracefully on SIGTERM or SIGINT.
+    """
+
+    def __init__(self, target, workers: int, callback=None) -> None:
+        """
+        :param target: function that each worker runs.
+        :param workers: number of workers.
+        :param callback: function called on every check of workers.
+        """
+        self.target = target
+        self.workers = workers
+        self.callback = callback
+        self.processes = {}
+
+        self._context = multiprocessing.get_context("fork")
+        self._stopping = False
+
+    def _spawn(self, number: int) -> None:
+        process = self._context.Process(
+            target=run_worker, args=(self.target,), name="worker-{}".format(number)
+        )
+        process.start()
+
+        self.processes[number] = process
+
+        logger.info("Started worker %s with pid %s.", number, process.pid)
+
+    def start(self) -> None:
+        """
+        Start all workers.
+        """
+        for number in range(self.workers):
+            self._spawn(number)
+
+    def check(self) -> int:
+        """
+        Restart workers that have died.
+
+        :return: number of restarted workers.
+        """
+        restarted = 0
+
+        for number, process in list(self.processes.items()):
+            if process.is_alive() or self._stopping:
+                continue
+
+            process.join()
+            logger.warning(
+                "Worker %s with pid %s died with exit code %s, restarting it.",
+                number,
+                process.pid,
+                process.exitcode,
+            )
+
+            self._spawn(number)
+            restarted += 1
+
+        return restarted
+
+    def stop(self, timeout: float = WORKERS_SHUTDOWN_TIMEOUT) -> None:
+        """
+        Ask workers to finish, killing those that don't in time.
+
+        :param timeout: seconds to wait for workers to finish.
+        """
+        self._stopping = True
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for number, process in self.processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+
+            if process.is_alive():
+                logger.warning("Worker %s didn't stop in time, killing it.", number)
+                process.kill()
+                process.join()
+
+        logger.info("Stopped %s workers.", len(self.processes))
+
+    def _handle_signal(self, signum, frame) -> None:
+        logger.info("Received signal %s, stopping workers.", signum)
+
+        self._stopping = True
+
+    def run(self, interval: float = WORKERS_CHECK_INTERVAL) -> None:
+        """
+        Start workers and supervise them until SIGTERM or SIGINT.
+
+        :param interval: seconds between checks of workers.
+        """
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        self.start()
+
+        while not self._stopping:
+            time.sleep(interval)
+            self.check()
+
+            if self.callback is not None:
+                try:
+                    self.callback()
+                except Exception:
+                    logger.exception("Supervisor callback failed.")
+
+        self.stop()
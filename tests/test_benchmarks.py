@@ -0,0 +1,49 @@
+import json
+
+from benchmarks.generator import write_recipe_book, generate_fridges
+from benchmarks.load import run_load
+from benchmarks.timing import percentile, summarize
+
+
+def test_write_recipe_book(tmp_path):
+    """
+    Test that generated book is valid and the same for the same seed.
+    """
+    file_path = tmp_path / "data" / "recipes.json"
+
+    write_recipe_book(file_path, 20, 10, 3, seed=1)
+    with file_path.open(encoding="UTF-8") as f:
+        recipes = json.load(f)["recipes"]
+
+    write_recipe_book(file_path, 20, 10, 3, seed=1)
+    with file_path.open(encoding="UTF-8") as f:
+        assert json.load(f)["recipes"] == recipes
+
+    assert len(recipes) == 20
+    assert all(len({x["item"] for x in y["components"]}) == 3 for y in recipes)
+    assert len(generate_fridges(5, 10, 10)[0]) == 10
+
+
+def test_summarize():
+    """
+    Test percentiles of timings.
+    """
+    timings = [x / 1000 for x in range(1, 101)]
+
+    summary = summarize(timings)
+
+    assert percentile([1, 2, 3], 0.5) == 2
+    assert summary["runs"] == 100
+    assert round(summary["p50_ms"]) == 50
+    assert round(summary["p99_ms"]) == 99
+    assert summarize([]) == {"runs": 0}
+
+
+async def test_run_load(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    result = await run_load(client, [("GET", "/components/popular", {})], 10, 3)
+
+    assert result["runs"] == 10
+    assert result["statuses"] == {"200": 10}
+    assert result["errors"] == 0
@@ -0,0 +1,44 @@
+from src.cache import ResultCache, get_fridge_key
+
+
+def test_get_fridge_key_canonical():
+    assert get_fridge_key({"a": 1, "b": 2}) == get_fridge_key({"b": 2, "a": 1})
+    assert get_fridge_key({"a": 1, "b": 2}) != get_fridge_key({"a": 2, "b": 1})
+    assert get_fridge_key({"a": 1}) != get_fridge_key({"a": 1}, (True, 0))
+
+
+def test_result_cache_hits_and_misses():
+    cache = ResultCache(size=10, ttl=60)
+
+    assert cache.get({"a": 1}) is None
+
+    cache.put({"a": 1}, [{"name": "first", "quantity": 1.0}])
+
+    assert cache.get({"a": 1}) == [{"name": "first", "quantity": 1.0}]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(size=6, ttl=60)
+
+    cache.put({"a": 1}, [1, 2])
+    cache.put({"b": 1}, [1])
+    cache.get({"a": 1})
+    cache.put({"c": 1}, [1])
+
+    assert cache.get({"b": 1}) is None
+    assert cache.get({"a": 1}) == [1, 2]
+    assert cache.get({"c": 1}) == [1]
+
+    cache.put({"d": 1}, list(range(10)))
+
+    assert len(cache) == 2
+
+
+def test_result_cache_ttl():
+    cache = ResultCache(size=10, ttl=-1)
+
+    cache.put({"a": 1}, [])
+
+    assert cache.get({"a": 1}) is None
+    assert len(cache) == 0
@@ -0,0 +1,33 @@
+import pytest
+import json
+
+from src.codec import loads, dumps, JSONDecodeError, ITEM_SEPARATOR
+
+
+def test_dumps_utf8():
+    data = [{"name": "Салат «Русский»", "quantity": 0.5}]
+
+    assert dumps(data).decode("utf-8").startswith('[{"name"')
+    assert "Салат «Русский»".encode("utf-8") in dumps(data)
+    assert json.loads(dumps(data)) == data
+
+
+def test_loads_bytes_and_str():
+    data = {"мясо": 200}
+
+    assert loads(json.dumps(data).encode("utf-8")) == data
+    assert loads(json.dumps(data)) == data
+
+
+def test_loads_invalid():
+    with pytest.raises(JSONDecodeError):
+        loads(b"Hello")
+
+    with pytest.raises(JSONDecodeError):
+        loads(b'{"\xff": 1}')
+
+
+def test_item_separator():
+    data = [{"a": 1}, {"b": 2}]
+
+    assert dumps(data) == b"[" + ITEM_SEPARATOR.join(dumps(x) for x in data) + b"]"
@@ -1,7 +1,23 @@
+import pytest
+import asyncio
+import aiosqlite
+import sqlite3
 import json
 
-from data.config import FILE_PATH
-from src.db import db_fill, get_query_results, execute_query
+from data.config import FILE_PATH, DB_PATH
+from src.db import (
+    SCHEMA_VERSION,
+    db_fill,
+    db_migrate,
+    db_is_current,
+    get_query_results,
+    execute_query,
+    execute_transaction,
+    open_pool,
+    close_pool,
+    get_possible_recipes,
+)
+from src.index import get_recipe_index, drop_recipe_index
 
 
 async def test_db_fill():
@@ -11,11 +27,10 @@ async def test_db_fill():
     recipes_before = await get_query_results("SELECT * FROM recipes")
 
     new_recipe_name = "test_recipe"
-    new_recipe_components = [{"item": "мясо", "q": 1000}]
 
     await execute_query(
-        "INSERT INTO recipes (recipe_name, components) VALUES (?,?)",
-        (new_recipe_name, json.dumps(new_recipe_components)),
+        "INSERT INTO recipes (recipe_name, component_count) VALUES (?,?)",
+        (new_recipe_name, 0),
     )
 
     recipes_middle = await get_query_results("SELECT * FROM recipes")
@@ -32,18 +47,24 @@ async def test_get_query_results():
     """
     Test db creation, insertion, and selection of data.
     """
-    recipes = await get_query_results("SELECT * FROM recipes")
+    recipes = await get_query_results(
+        "SELECT recipe_name, component, q, last_recommended FROM recipes "
+        "JOIN recipe_components USING (recipe_id) "
+        "JOIN components USING (component_id) "
+        "ORDER BY recipe_id"
+    )
 
     with FILE_PATH.open(encoding="UTF-8") as f:
         original_recipes = json.load(f)["recipes"]
 
     formatted_recipes = []
     for recipe in original_recipes:
-        formatted_recipes.append(
-            (recipe["name"], json.dumps(recipe["components"], ensure_ascii=False), 0)
-        )
+        for component in recipe["components"]:
+            formatted_recipes.append(
+                (recipe["name"], component["item"], component["q"], 0)
+            )
 
-    assert recipes == formatted_recipes
+    assert sorted(recipes) == sorted(formatted_recipes)
 
 
 async def test_execute_query():
@@ -53,15 +74,290 @@ async def test_execute_query():
     recipes_before = await get_query_results("SELECT * FROM recipes")
 
     new_recipe_name = "test_recipe"
-    new_recipe_components = [{"item": "мясо", "q": 1000}]
 
     await execute_query(
-        "INSERT INTO recipes (recipe_name, components) VALUES (?,?)",
-        (new_recipe_name, json.dumps(new_recipe_components)),
+        "INSERT INTO recipes (recipe_name, component_count) VALUES (?,?)",
+        (new_recipe_name, 0),
     )
 
     recipes_after = await get_query_results("SELECT * FROM recipes")
 
-    recipes_before.append((new_recipe_name, json.dumps(new_recipe_components), 0))
+    recipes_before.append((len(recipes_before) + 1, new_recipe_name, 0, 0))
 
     assert recipes_before == recipes_after
+
+
+async def test_connection_pool():
+    """
+    Test that queries go through the pool while it is open.
+    """
+    pool = await open_pool(readers=2)
+
+    try:
+        await execute_query("UPDATE recipes SET last_recommended = 1")
+
+        async with pool.writer() as writer:
+            assert writer is pool._writer
+
+        recipes = await get_query_results("SELECT last_recommended FROM recipes")
+        journal_mode = await get_query_results("PRAGMA journal_mode")
+    finally:
+        await close_pool()
+
+    assert all(x[0] == 1 for x in recipes)
+    assert journal_mode == [("wal",)]
+
+
+async def test_execute_transaction():
+    """
+    Test that all queries of a transaction are committed together or not at all.
+    """
+    components_before = await get_query_results("SELECT * FROM components")
+
+    await execute_transaction(
+        [
+            (
+                "UPDATE components SET total_encountered = total_encountered + 1 "
+                "WHERE component = ?",
+                [("мясо",), ("огурец",)],
+            ),
+            ("UPDATE recipes SET last_recommended = ?", [(1,)]),
+        ]
+    )
+
+    components_middle = await get_query_results(
+        "SELECT component FROM components WHERE total_encountered = 1"
+    )
+
+    with pytest.raises(sqlite3.OperationalError):
+        await execute_transaction(
+            [
+                ("UPDATE recipes SET last_recommended = ?", [(2,)]),
+                ("UPDATE missing_table SET value = ?", [(2,)]),
+            ]
+        )
+
+    recipes_after = await get_query_results("SELECT last_recommended FROM recipes")
+
+    assert all(x[2] == 0 for x in components_before)
+    assert sorted(components_middle) == [("мясо",), ("огурец",)]
+    assert all(x[0] == 1 for x in recipes_after)
+
+
+async def test_db_migrate():
+    """
+    Test that missing indexes are added to an existing db.
+    """
+    await execute_query("DROP INDEX recipes_last_recommended")
+
+    db_migrate()
+
+    indexes = await get_query_results(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'recipes'"
+    )
+
+    assert ("recipes_last_recommended",) in indexes
+
+
+async def test_execute_transaction_cancelled(monkeypatch):
+    """
+    Test that a transaction cancelled before commit is not committed
+    by the next user of the pooled writer.
+    """
+    executemany = aiosqlite.Connection.executemany
+
+    async def cancelled_executemany(self, query, parameters):
+        if "recipes" in query:
+            raise asyncio.CancelledError
+
+        return await executemany(self, query, parameters)
+
+    await open_pool()
+
+    try:
+        monkeypatch.setattr(aiosqlite.Connection, "executemany", cancelled_executemany)
+
+        with pytest.raises(asyncio.CancelledError):
+            await execute_transaction(
+                [
+                    ("UPDATE components SET total_encountered = ?", [(7,)]),
+                    ("UPDATE recipes SET last_recommended = ?", [(7,)]),
+                ]
+            )
+
+        monkeypatch.undo()
+
+        await execute_query("UPDATE recipes SET last_recommended = 1")
+        components = await get_query_results(
+            "SELECT component FROM components WHERE total_encountered = 7"
+        )
+    finally:
+        await close_pool()
+
+    assert components == []
+
+
+def test_db_is_current(tmp_path):
+    """
+    Test that only existing db of the current schema version needs no migration.
+    """
+    db_path = tmp_path / "missing.db"
+
+    assert not db_is_current(db_path)
+    assert not db_path.exists()
+
+    assert db_is_current()
+
+    with sqlite3.connect(DB_PATH) as db:
+        db.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION - 1))
+
+    assert not db_is_current()
+
+
+def test_db_migrate_v2():
+    """
+    Test that recipe book of db without generation id is given one.
+    """
+    with sqlite3.connect(DB_PATH) as db:
+        db.execute("DROP TABLE book")
+        db.execute("PRAGMA user_version = 2")
+
+    db_migrate()
+
+    with sqlite3.connect(DB_PATH) as db:
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        generations = db.execute("SELECT generation FROM book").fetchall()
+
+    assert version == SCHEMA_VERSION
+    assert len(generations) == 1
+    assert get_recipe_index().version == generations[0][0]
+
+
+async def test_db_migrate_v1(tmp_path):
+    """
+    Test that db with components stored as json is moved to normalized tables.
+    """
+    db_path = tmp_path / "v1.db"
+
+    with sqlite3.connect(db_path) as db:
+        db.execute(
+            "CREATE TABLE recipes (recipe_name TEXT PRIMARY KEY, components TEXT, "
+            "last_recommended INTEGER DEFAULT 0)"
+        )
+        db.execute(
+            "CREATE TABLE components (component TEXT PRIMARY KEY, "
+            "total_encountered INTEGER DEFAULT 0)"
+        )
+        db.execute(
+            "INSERT INTO recipes VALUES (?,?,?)",
+            (
+                "омлет",
+                json.dumps([{"item": "яйцо", "q": 2}, {"item": "молоко", "q": 1}]),
+                5,
+            ),
+        )
+        db.execute("INSERT INTO components VALUES (?,?)", ("яйцо", 3))
+
+    db_migrate(db_path)
+
+    with sqlite3.connect(db_path) as db:
+        recipes = db.execute(
+            "SELECT recipe_name, component_count, last_recommended FROM recipes"
+        ).fetchall()
+        components = db.execute(
+            "SELECT component, total_encountered FROM components"
+        ).fetchall()
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+
+    possible_recipes = await get_possible_recipes({"яйцо": 4, "молоко": 3}, db_path)
+
+    drop_recipe_index(db_path)
+
+    assert recipes == [("омлет", 2, 5)]
+    assert sorted(components) == [("молоко", 0), ("яйцо", 3)]
+    assert version == SCHEMA_VERSION
+    assert possible_recipes == [{"name": "омлет", "quantity": 2.0}]
+
+
+async def test_get_possible_recipes():
+    """
+    Test that recipes matched by SQLite are the same as matched by index.
+    """
+    fridge_components = {"мясо": 1000, "огурец": 3, "картофель": 20, "лук": 5}
+
+    possible_recipes = await get_possible_recipes(fridge_components)
+
+    index = get_recipe_index()
+
+    assert possible_recipes == index.get_recipes(index.match(fridge_components))
+    assert await get_possible_recipes({"несуществующий": 1}) == []
+
+    for floor, min_quantity in ((True, 0), (False, 2), (True, 1.5)):
+        possible_recipes = await get_possible_recipes(
+            fridge_components, floor=floor, min_quantity=min_quantity
+        )
+
+        assert possible_recipes == index.get_recipes(
+            index.match(fridge_components, floor, min_quantity)
+        )
+
+
+def test_db_fill_invalid_file(tmp_path):
+    """
+    Test that db is not left behind if import fails.
+    """
+    file_path = tmp_path / "recipes.json"
+    file_path.write_text('{"recipes": [{"name": "a"}]}', encoding="UTF-8")
+    db_path = tmp_path / "recipes.db"
+
+    with pytest.raises(KeyError):
+        db_fill(file_path, db_path)
+
+    assert not db_path.exists()
+
+
+async def test_db_duplicated_items(tmp_path):
+    """
+    Test that an item listed twice in a recipe is stored once with the larger quantity,
+    both when db is filled from file and when it is migrated.
+    """
+    components = [{"item": "яйцо", "q": 2}, {"item": "молоко", "q": 1}]
+    components.append({"item": "яйцо", "q": 3})
+
+    file_path = tmp_path / "recipes.json"
+    file_path.write_text(
+        json.dumps({"recipes": [{"name": "омлет", "components": components}]}),
+        encoding="UTF-8",
+    )
+    db_path = tmp_path / "recipes.db"
+    v1_path = tmp_path / "v1.db"
+
+    db_fill(file_path, db_path)
+
+    with sqlite3.connect(v1_path) as db:
+        db.execute(
+            "CREATE TABLE recipes (recipe_name TEXT PRIMARY KEY, components TEXT, "
+            "last_recommended INTEGER DEFAULT 0)"
+        )
+        db.execute(
+            "CREATE TABLE components (component TEXT PRIMARY KEY, "
+            "total_encountered INTEGER DEFAULT 0)"
+        )
+        db.execute(
+            "INSERT INTO recipes VALUES (?,?,?)", ("омлет", json.dumps(components), 0)
+        )
+
+    db_migrate(v1_path)
+
+    for path in (db_path, v1_path):
+        with sqlite3.connect(path) as db:
+            component_count = db.execute(
+                "SELECT component_count FROM recipes"
+            ).fetchone()[0]
+
+        possible_recipes = await get_possible_recipes({"яйцо": 6, "молоко": 3}, path)
+
+        drop_recipe_index(path)
+
+        assert component_count == 2
+        assert possible_recipes == [{"name": "омлет", "quantity": 2.0}]
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+
+from src.db import db_fill
+from src.executor import (
+    MatchingExecutor,
+    start_matching_executor,
+    stop_matching_executor,
+    should_offload,
+    match,
+    match_many,
+)
+from src.index import RecipeIndex, get_recipe_index
+
+FRIDGE_COMPONENTS = {
+    "мясо": 200,
+    "огурец": 1,
+    "картофель": 10,
+}
+
+
+async def test_matching_executor_offloads_over_threshold(monkeypatch):
+    expected_result = get_recipe_index().match(FRIDGE_COMPONENTS)
+
+    await start_matching_executor(workers=1, threshold=2)
+
+    try:
+        assert not should_offload([{"огурец": 1}])
+        assert should_offload([FRIDGE_COMPONENTS])
+
+        # Matching in this process would fail, so results come from the worker
+        def match_inline(self, fridges):
+            raise AssertionError("Matched inline.")
+
+        monkeypatch.setattr(RecipeIndex, "match_many", match_inline)
+
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+        assert await match_many([FRIDGE_COMPONENTS, {"огурец": 1}]) == [
+            expected_result,
+            [],
+        ]
+    finally:
+        await stop_matching_executor()
+
+    assert not should_offload([FRIDGE_COMPONENTS])
+
+
+async def test_matching_executor_starts_in_background():
+    expected_result = get_recipe_index().match(FRIDGE_COMPONENTS)
+
+    executor = await start_matching_executor(workers=1, threshold=0, background=True)
+
+    try:
+        # Matching is inline until processes load the recipe book
+        assert executor.is_starting()
+        assert not should_offload([FRIDGE_COMPONENTS])
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+
+        await executor._starting
+
+        assert should_offload([FRIDGE_COMPONENTS])
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+    finally:
+        await stop_matching_executor()
+
+
+async def test_matching_executor_failed_start(monkeypatch, caplog):
+    expected_result = get_recipe_index().match(FRIDGE_COMPONENTS)
+
+    async def start(self):
+        raise OSError("Can't start processes.")
+
+    monkeypatch.setattr(MatchingExecutor, "start", start)
+
+    executor = await start_matching_executor(workers=1, threshold=0, background=True)
+
+    try:
+        with caplog.at_level(logging.ERROR, logger="recipe_service"):
+            while executor.is_starting():
+                await asyncio.sleep(0)
+
+            # Matching stays inline instead of going to processes that didn't start
+            assert not should_offload([FRIDGE_COMPONENTS])
+            assert await match(FRIDGE_COMPONENTS) == expected_result
+
+        assert len([x for x in caplog.records if x.levelno == logging.ERROR]) == 1
+    finally:
+        await stop_matching_executor()
+
+
+def fail_init_worker(db_path, engine):
+    raise OSError("Can't load recipe book.")
+
+
+async def test_matching_executor_failed_restart(monkeypatch):
+    executor = await start_matching_executor(workers=1, threshold=0)
+
+    try:
+        db_fill(force_recreate=True)
+
+        # Initializer is looked up by name, so worker processes import this one
+        monkeypatch.setattr("src.executor._init_worker", fail_init_worker)
+
+        expected_result = get_recipe_index().match(FRIDGE_COMPONENTS)
+
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+        assert executor._pool is None
+        assert not should_offload([FRIDGE_COMPONENTS])
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+    finally:
+        await stop_matching_executor()
+
+
+async def test_matching_executor_broken_pool():
+    expected_result = get_recipe_index().match(FRIDGE_COMPONENTS)
+
+    executor = await start_matching_executor(workers=1, threshold=0)
+
+    try:
+        for process in list(executor._pool._processes.values()):
+            process.kill()
+            process.join()
+
+        # Matching falls back to inline and processes are started anew after
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+        assert await match(FRIDGE_COMPONENTS) == expected_result
+        assert executor.index is get_recipe_index()
+    finally:
+        await stop_matching_executor()
+
+
+async def test_matching_executor_restarts_on_reload():
+    executor = await start_matching_executor(workers=1, threshold=0)
+
+    try:
+        index = executor.index
+
+        db_fill(force_recreate=True)
+
+        await match(FRIDGE_COMPONENTS)
+
+        assert executor.index is not index
+        assert executor.index is get_recipe_index()
+    finally:
+        await stop_matching_executor()
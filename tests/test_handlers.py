@@ -1,5 +1,7 @@
 import json
 
+from src.main import create_app
+
 
 async def test_handler_index(aiohttp_client, get_app):
     client = await aiohttp_client(get_app)
@@ -33,7 +35,7 @@ async def test_handler_recipes_correct(aiohttp_client, get_app):
     )
     result = await response.text()
 
-    assert expected_result == result
+    assert json.loads(expected_result) == json.loads(result)
 
 
 async def test_handler_recipes_invalid_decode(aiohttp_client, get_app):
@@ -48,7 +50,7 @@ async def test_handler_recipes_invalid_decode(aiohttp_client, get_app):
     expected_result = json.dumps({"error": "Failed to decode JSON."})
     result = await response.text()
 
-    assert expected_result == result
+    assert json.loads(expected_result) == json.loads(result)
 
 
 async def test_handler_recipes_invalid_data(aiohttp_client, get_app):
@@ -69,7 +71,7 @@ async def test_handler_recipes_invalid_data(aiohttp_client, get_app):
     expected_result = json.dumps({"error": "JSON contains invalid data."})
     result = await response.text()
 
-    assert expected_result == result
+    assert json.loads(expected_result) == json.loads(result)
 
 
 async def test_handler_last_recommended_recipes(aiohttp_client, get_app):
@@ -82,7 +84,7 @@ async def test_handler_last_recommended_recipes(aiohttp_client, get_app):
     expected_result = json.dumps({"last_recommended_recipes": []}, ensure_ascii=False)
     result = await response.text()
 
-    assert expected_result == result
+    assert json.loads(expected_result) == json.loads(result)
 
 
 async def test_handler_popular_components(aiohttp_client, get_app):
@@ -106,4 +108,286 @@ async def test_handler_popular_components(aiohttp_client, get_app):
     )
     result = await response.text()
 
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_last_recommended_recipes_time_period(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 200, "огурец": 1})
+    await client.post("/recipes/possible", data=payload)
+
+    response = await client.get("/recipes/last", params={"time_period": 60})
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        {"last_recommended_recipes": ["Салат «Русский»"]}, ensure_ascii=False
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_last_recommended_recipes_invalid_time_period(
+    aiohttp_client, get_app
+):
+    client = await aiohttp_client(get_app)
+
+    response = await client.get("/recipes/last", params={"time_period": "hour"})
+
+    assert response.status == 400
+
+    expected_result = json.dumps(
+        {
+            "error": "Invalid query parameter.",
+            "error_details": {"parameter": "time_period"},
+        }
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_popular_components_limit(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    response = await client.get("/components/popular", params={"limit": 2})
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        {"most_popular_components": [{"яйцо": 0}, {"рыба": 0}]}, ensure_ascii=False
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_recipes_batch(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps([{"мясо": 200, "огурец": 1}, {"рыба": 1}])
+
+    response = await client.post("/recipes/possible/batch", data=payload)
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        [[{"name": "Салат «Русский»", "quantity": 0.5}], []], ensure_ascii=False
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_recipes_batch_ndjson(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = "\n".join(
+        json.dumps(x) for x in [{"рыба": 1}, {"мясо": 250, "огурец": 2}]
+    )
+
+    response = await client.post(
+        "/recipes/possible/batch",
+        data=payload,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        [[], [{"name": "Салат «Русский»", "quantity": 1.0}]], ensure_ascii=False
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_recipes_floor_and_min_quantity(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 1000, "огурец": 3, "картофель": 20})
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"floor": 1, "min_quantity": 2}
+    )
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        [{"name": "Салат «Ленинградский»", "quantity": 2}], ensure_ascii=False
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"min_quantity": -1}
+    )
+
+    assert response.status == 400
+
+    # Explicitly off floor is the same as no floor
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"min_quantity": 2}
+    )
+    expected_result = await response.json()
+
+    for value in ("0", "false", "No"):
+        response = await client.post(
+            "/recipes/possible",
+            data=payload,
+            params={"floor": value, "min_quantity": 2},
+        )
+
+        assert await response.json() == expected_result
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"floor": "maybe"}
+    )
+
+    assert response.status == 400
+    assert (await response.json())["error_details"] == {"parameter": "floor"}
+
+
+async def test_handler_partial_recipes(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 500, "огурец": 4})
+
+    response = await client.post(
+        "/recipes/partial", data=payload, params={"max_missing": 0}
+    )
+
+    assert response.status == 200
+
+    expected_result = json.dumps(
+        [{"name": "Салат «Русский»", "quantity": 2.0, "missing": []}],
+        ensure_ascii=False,
+    )
+    result = await response.text()
+
+    assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_partial_recipes_invalid_parameters(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 500})
+
+    for parameter, value in (("max_missing", -1), ("limit", 0), ("limit", 1001)):
+        response = await client.post(
+            "/recipes/partial", data=payload, params={parameter: value}
+        )
+
+        assert response.status == 400
+
+        expected_result = json.dumps(
+            {
+                "error": "Invalid query parameter.",
+                "error_details": {"parameter": parameter},
+            }
+        )
+        result = await response.text()
+
+        assert json.loads(expected_result) == json.loads(result)
+
+
+async def test_handler_recipes_stream_json(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 200, "огурец": 1, "картофель": 10})
+
+    response = await client.post("/recipes/possible", data=payload)
+    expected_result = await response.text()
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"stream": 1}
+    )
+
+    assert response.status == 200
+    assert response.content_type == "application/json"
+    assert response.headers.get("Transfer-Encoding") == "chunked"
+
+    result = await response.text()
+
+    assert expected_result == result
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"stream": "false"}
+    )
+
+    assert response.headers.get("Transfer-Encoding") is None
+    assert await response.text() == expected_result
+
+    response = await client.post(
+        "/recipes/possible", data=payload, params={"stream": "maybe"}
+    )
+
+    assert response.status == 400
+
+
+async def test_handler_recipes_stream_ndjson(aiohttp_client, get_app):
+    client = await aiohttp_client(get_app)
+
+    payload = json.dumps({"мясо": 200, "огурец": 1, "картофель": 10})
+
+    response = await client.post(
+        "/recipes/possible",
+        data=payload,
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.status == 200
+    assert response.content_type == "application/x-ndjson"
+
+    expected_result = [
+        {"name": "Салат «Русский»", "quantity": 0.5},
+        {"name": "Салат «Ленинградский»", "quantity": 0.4},
+    ]
+    result = [json.loads(x) for x in (await response.text()).splitlines()]
+
     assert expected_result == result
+
+
+async def test_handler_reload(aiohttp_client, get_app, monkeypatch):
+    client = await aiohttp_client(get_app)
+
+    # Off without configured token
+    response = await client.post("/admin/reload")
+
+    assert response.status == 403
+
+    monkeypatch.setattr("src.handlers.ADMIN_TOKEN", "secret")
+
+    for headers in ({}, {"X-Admin-Token": "wrong"}):
+        response = await client.post("/admin/reload", headers=headers)
+
+        assert response.status == 403
+
+    response = await client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+
+    assert response.status == 200
+    assert await response.json() == {"recipes": 3, "components": 5}
+
+
+async def test_handler_metrics(aiohttp_client):
+    client = await aiohttp_client(create_app(prepare_db=False))
+
+    await client.post("/recipes/possible", json={"мясо": 500, "огурец": 2})
+    await client.post("/recipes/possible", json={"мясо": 500, "огурец": 2})
+
+    response = await client.get("/metrics")
+
+    assert response.status == 200
+
+    lines = (await response.text()).splitlines()
+
+    assert (
+        'recipe_service_requests_total{method="POST",route="/recipes/possible",'
+        'status="200"} 2' in lines
+    )
+    assert "recipe_service_result_cache_hit_ratio 0.5" in lines
+    assert any('stage="validation"' in x for x in lines)
+    assert any("recipe_service_db_query_duration_seconds_count" in x for x in lines)
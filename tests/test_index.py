@@ -0,0 +1,105 @@
+from src.db import db_fill, execute_query
+from src.index import RecipeIndex, get_recipe_index
+from src.symbols import Recipe
+
+
+def test_recipe_index_match():
+    index = RecipeIndex(
+        [
+            ("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}]),
+            ("second", [{"item": "b", "q": 4}]),
+            ("third", [{"item": "c", "q": 1}]),
+        ]
+    )
+
+    expected_result = [
+        {"name": "first", "quantity": 1.5},
+        {"name": "second", "quantity": 0.5},
+    ]
+    result = index.get_recipes(index.match({"a": 3, "b": 2}))
+
+    assert expected_result == result
+
+
+def test_recipe_index_match_floor_and_min_quantity():
+    index = RecipeIndex(
+        [
+            ("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}]),
+            ("second", [{"item": "b", "q": 4}]),
+            ("third", [{"item": "a", "q": 1}]),
+        ]
+    )
+    fridge_components = {"a": 5, "b": 6}
+
+    expected_result = [
+        {"name": "first", "quantity": 2},
+        {"name": "second", "quantity": 1},
+        {"name": "third", "quantity": 5},
+    ]
+
+    result = index.get_recipes(index.match(fridge_components, floor=True))
+
+    assert expected_result == result
+    assert index.match(fridge_components, floor=True, min_quantity=1.5) == [
+        Recipe(0, 2),
+        Recipe(2, 5),
+    ]
+    assert index.match(fridge_components, min_quantity=2.5) == [
+        Recipe(0, 2.5),
+        Recipe(2, 5.0),
+    ]
+
+
+def test_recipe_index_match_unknown_components():
+    index = RecipeIndex([("first", [{"item": "a", "q": 2}])])
+
+    assert index.match({"b": 1}) == []
+
+
+def test_recipe_index_match_partial():
+    index = RecipeIndex(
+        [
+            ("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}]),
+            ("second", [{"item": "b", "q": 4}]),
+            ("third", [{"item": "a", "q": 1}, {"item": "c", "q": 1}]),
+            ("fourth", [{"item": "c", "q": 1}]),
+        ]
+    )
+
+    expected_result = [
+        {"name": "first", "quantity": 1.5, "missing": []},
+        {"name": "second", "quantity": 0.5, "missing": []},
+        {"name": "third", "quantity": 3.0, "missing": ["c"]},
+    ]
+    result = index.match_partial({"a": 3, "b": 2}, max_missing=1)
+
+    assert expected_result == result
+    assert index.match_partial({"a": 3, "b": 2}, max_missing=0) == result[:2]
+    assert index.match_partial({"a": 3, "b": 2}, limit=1) == result[:1]
+
+
+async def test_recipe_index_rebuilt_on_db_fill():
+    index_before = get_recipe_index()
+
+    await execute_query(
+        "INSERT INTO recipes (recipe_name, component_count) VALUES (?,?)",
+        ("test_recipe", 0),
+    )
+
+    assert get_recipe_index() is index_before
+
+    db_fill(force_recreate=True)
+
+    assert get_recipe_index() is not index_before
+
+
+def test_recipe_index_components():
+    index = RecipeIndex(
+        [("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}])],
+    )
+
+    assert set(index.components) == {"a", "b"}
+
+    index = RecipeIndex([("first", [{"item": "a", "q": 2}])], ("a", "c"))
+
+    assert set(index.components) == {"a", "c"}
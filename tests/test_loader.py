@@ -0,0 +1,46 @@
+import json
+import pytest
+
+from data.config import FILE_PATH
+from src.loader import iter_recipes_chunked, iter_recipes, iter_batches
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 2 ** 20])
+def test_iter_recipes_chunked(chunk_size):
+    """
+    Test that recipes read in chunks are the same as read at once.
+    """
+    with FILE_PATH.open(encoding="UTF-8") as f:
+        expected_recipes = json.load(f)["recipes"]
+
+    recipes = list(iter_recipes_chunked(FILE_PATH, chunk_size))
+
+    assert recipes == expected_recipes
+    assert list(iter_recipes(FILE_PATH)) == expected_recipes
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        '{"recipes": [{"name": "a", "components": []}, {"name": ',
+        '{"recipes": [{"name": "a", "components": []}',
+        '{"meals": []}',
+    ],
+)
+def test_iter_recipes_chunked_invalid(tmp_path, data):
+    """
+    Test that truncated files and files without recipes are rejected.
+    """
+    file_path = tmp_path / "recipes.json"
+    file_path.write_text(data, encoding="UTF-8")
+
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_recipes_chunked(file_path, 8))
+
+
+def test_iter_batches():
+    """
+    Test that iterable is split into batches of the given size.
+    """
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 2)) == []
@@ -0,0 +1,43 @@
+import logging
+import os
+import subprocess
+import sys
+
+from src.log import get_logger, stop_queue_listeners
+
+
+def test_get_logger_file_handler(tmp_path):
+    """
+    Test that records are written to file by the background listener.
+    """
+    file_name = tmp_path / "test.log"
+
+    logger = get_logger(
+        "test_file_logger", logging.INFO, file_handler=True, file_name=file_name
+    )
+    logger.propagate = False
+
+    logger.debug("Skipped %s.", "record")
+    logger.info("Written %s.", "record")
+
+    stop_queue_listeners()
+
+    text = file_name.read_text()
+
+    assert "Written record." in text
+    assert "Skipped" not in text
+
+
+def test_unknown_log_level():
+    """
+    Test that unknown log level in environment fails with the name of the variable.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", "import data.config"],
+        env=dict(os.environ, RECIPE_SERVICE_LOG_LEVEL="verbose"),
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.returncode != 0
+    assert "RECIPE_SERVICE_LOG_LEVEL" in result.stderr
@@ -0,0 +1,56 @@
+import pytest
+import random
+
+from src.index import RecipeIndex, get_matcher
+
+pytest.importorskip("numpy")
+
+
+def test_recipe_matrix_match():
+    index = RecipeIndex(
+        [
+            ("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}]),
+            ("empty", []),
+            ("second", [{"item": "b", "q": 4}]),
+            ("third", [{"item": "c", "q": 1}]),
+        ]
+    )
+
+    expected_result = [
+        {"name": "first", "quantity": 1.5},
+        {"name": "second", "quantity": 0.5},
+    ]
+    result = index.get_recipes(index.matrix.match({"a": 3, "b": 2, "d": 1}))
+
+    assert expected_result == result
+
+
+def test_recipe_matrix_match_many_same_as_index():
+    random.seed(0)
+
+    components = ["component_{}".format(x) for x in range(30)]
+    recipes = [
+        (
+            "recipe_{}".format(x),
+            [
+                {"item": item, "q": random.randint(1, 10)}
+                for item in random.sample(components, random.randint(1, 5))
+            ],
+        )
+        for x in range(200)
+    ]
+    fridges = [
+        {item: random.randint(0, 20) for item in random.sample(components, 20)}
+        for _ in range(50)
+    ]
+
+    index = RecipeIndex(recipes)
+
+    assert index.matrix.match_many(fridges) == index.match_many(fridges)
+    assert index.matrix.match_many(fridges, True, 1) == index.match_many(
+        fridges, True, 1
+    )
+
+
+def test_get_matcher_numpy():
+    assert get_matcher(engine="numpy") is get_matcher(engine="python").matrix
@@ -0,0 +1,66 @@
+from src.metrics import Metrics, metrics, get_query_label, record_startup
+
+
+def test_metrics_render():
+    """
+    Test text format of counters, gauges and histograms.
+    """
+    metrics = Metrics(buckets=(0.1, 1))
+
+    metrics.inc("requests_total", route="/", status=200)
+    metrics.inc("requests_total", route="/", status=200)
+    metrics.set("ratio", 0.5)
+    metrics.observe("duration_seconds", 0.1, stage="a")
+    metrics.observe("duration_seconds", 0.5, stage="a")
+    metrics.observe("duration_seconds", 2, stage="a")
+
+    lines = metrics.render().splitlines()
+
+    assert 'requests_total{route="/",status="200"} 2' in lines
+    assert "ratio 0.5" in lines
+    assert 'duration_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'duration_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'duration_seconds_sum{stage="a"} 2.6' in lines
+    assert 'duration_seconds_count{stage="a"} 3' in lines
+
+
+def test_metrics_timer():
+    """
+    Test that timer observes duration even if block fails.
+    """
+    metrics = Metrics(buckets=(1,))
+
+    try:
+        with metrics.timer("duration_seconds"):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert metrics.histograms[("duration_seconds", ())][0] == 1
+
+
+def test_get_query_label():
+    """
+    Test that IN queries of any length have the same label.
+    """
+    assert get_query_label("SELECT a FROM b WHERE c IN (?,?,?)") == get_query_label(
+        "SELECT a FROM b\n  WHERE c IN (?, ?)"
+    )
+
+
+def test_record_startup():
+    """
+    Test that every startup stage is recorded once.
+    """
+    duration = record_startup("test_stage")
+
+    try:
+        assert duration > 0
+        assert record_startup("test_stage") is None
+        assert (
+            'recipe_service_startup_seconds{stage="test_stage"} ' + str(duration)
+            in metrics.render().splitlines()
+        )
+    finally:
+        metrics.gauges.clear()
@@ -3,11 +3,17 @@ import json
 
 from src.recipes import (
     process_payload,
+    process_batch_payload,
     get_recipes_from_components,
+    get_recipes_from_components_batch,
+    get_partial_recipes_from_components,
+    iter_recipes_from_components,
     get_most_popular_components,
     get_last_recommended_recipes,
 )
 from src.exceptions import JSONValidationError
+from src.index import get_recipe_index
+from src.db import db_fill
 
 
 async def test_proceed_payload_correct():
@@ -135,3 +141,134 @@ async def test_get_most_popular_components_some():
     result = await get_most_popular_components()
 
     assert expected_result == result
+
+
+async def test_process_batch_payload_ndjson():
+    payload = [{"мясо": 200}, {"огурец": 1}]
+
+    processed_payload = await process_batch_payload(
+        "\n".join(json.dumps(x) for x in payload) + "\n", ndjson=True
+    )
+
+    assert payload == processed_payload
+
+
+async def test_process_batch_payload_invalid_fridge():
+    payload = [{"мясо": 200}, {"test": 1}]
+
+    with pytest.raises(JSONValidationError) as e:
+        await process_batch_payload(json.dumps(payload))
+
+    assert json.loads(e.value.text)["error_details"] == {"index": 1}
+
+
+async def test_process_batch_payload_invalid_format_not_list():
+    payload = {"мясо": 200}
+
+    with pytest.raises(JSONValidationError):
+        await process_batch_payload(json.dumps(payload))
+
+
+async def test_get_recipes_from_components_batch():
+    fridges = [
+        {"мясо": 200, "огурец": 1, "картофель": 10},
+        {"мясо": 10000},
+        {"мясо": 500, "картофель": 3},
+    ]
+
+    expected_result = [
+        [
+            {"name": "Салат «Русский»", "quantity": 0.5},
+            {"name": "Салат «Ленинградский»", "quantity": 0.4},
+        ],
+        [],
+        [{"name": "Салат «Ленинградский»", "quantity": 1.0}],
+    ]
+    result = await get_recipes_from_components_batch(fridges)
+
+    assert expected_result == result
+
+    expected_result = {
+        "most_popular_components": [{"мясо": 3}, {"картофель": 2}, {"огурец": 1}]
+    }
+    result = await get_most_popular_components(3)
+
+    assert expected_result == result
+
+
+async def test_get_partial_recipes_from_components():
+    fridge_components = {
+        "мясо": 500,
+        "огурец": 4,
+    }
+
+    expected_result = [
+        {"name": "Салат «Русский»", "quantity": 2.0, "missing": []},
+        {"name": "Салат «Ленинградский»", "quantity": 1.0, "missing": ["картофель"]},
+    ]
+    result = await get_partial_recipes_from_components(fridge_components)
+
+    assert expected_result == result
+
+    expected_result = {
+        "last_recommended_recipes": ["Салат «Ленинградский»", "Салат «Русский»"]
+    }
+    result = await get_last_recommended_recipes()
+
+    assert expected_result == result
+
+
+async def test_iter_recipes_from_components():
+    fridge_components = {
+        "мясо": 200,
+        "огурец": 1,
+        "картофель": 10,
+    }
+
+    expected_result = await get_recipes_from_components(fridge_components)
+    result = [
+        x async for x in iter_recipes_from_components(fridge_components, chunk_size=1)
+    ]
+
+    assert expected_result == result
+
+    expected_result = {
+        "most_popular_components": [{"огурец": 2}, {"мясо": 2}, {"картофель": 2}]
+    }
+    result = await get_most_popular_components(3)
+
+    assert expected_result == result
+
+
+async def test_get_recipes_from_components_cached():
+    fridge_components = {
+        "мясо": 200,
+        "огурец": 1,
+        "картофель": 10,
+    }
+
+    result_cache = get_recipe_index().result_cache
+
+    result = await get_recipes_from_components(fridge_components)
+    cached_result = await get_recipes_from_components(
+        dict(reversed(fridge_components.items()))
+    )
+
+    assert cached_result == result
+    assert (result_cache.hits, result_cache.misses) == (1, 1)
+
+    # Cache holds records with ids of recipes, names are added to every result
+    assert result_cache.get(fridge_components, (False, 0)) == (
+        get_recipe_index().match(fridge_components)
+    )
+
+    # Statistics are recorded on cache hits too
+    expected_result = {
+        "most_popular_components": [{"огурец": 2}, {"мясо": 2}, {"картофель": 2}]
+    }
+
+    assert expected_result == await get_most_popular_components(3)
+
+    db_fill(force_recreate=True)
+
+    assert get_recipe_index().result_cache.get(fridge_components) is None
@@ -0,0 +1,92 @@
+import json
+import shutil
+
+from data.config import DB_PATH
+from src.db import db_fill, db_reload, get_query_results, get_shadow_path
+from src.index import get_recipe_index, drop_recipe_index
+from src.recipes import get_recipes_from_components
+from src.reload import FileWatch, reload_recipe_book, refresh_recipe_index
+
+NEW_RECIPES = {
+    "recipes": [
+        {
+            "name": "Салат «Русский»",
+            "components": [{"item": "мясо", "q": 250}, {"item": "огурец", "q": 2}],
+        },
+        {"name": "Омлет", "components": [{"item": "яйцо", "q": 3}]},
+    ]
+}
+
+
+def write_recipes(file_path):
+    file_path.write_text(json.dumps(NEW_RECIPES, ensure_ascii=False), encoding="UTF-8")
+
+
+async def test_reload_recipe_book(tmp_path):
+    """
+    Test that new recipe book replaces the old one and statistics are kept.
+    """
+    file_path = tmp_path / "recipes.json"
+    write_recipes(file_path)
+
+    await get_recipes_from_components({"мясо": 500, "огурец": 4, "картофель": 10})
+    old_index = get_recipe_index()
+
+    index = await reload_recipe_book(file_path)
+
+    recipes = await get_query_results(
+        "SELECT recipe_name, last_recommended > 0 FROM recipes ORDER BY recipe_id"
+    )
+    components = await get_query_results(
+        "SELECT component, total_encountered FROM components ORDER BY component"
+    )
+
+    assert index is get_recipe_index() and index is not old_index
+    assert recipes == [("Салат «Русский»", 1), ("Омлет", 0)]
+    assert components == [("мясо", 1), ("огурец", 1), ("яйцо", 0)]
+    assert index.get_recipes(index.match({"яйцо": 6})) == [
+        {"name": "Омлет", "quantity": 2.0}
+    ]
+    assert not get_shadow_path().exists()
+
+
+async def test_refresh_recipe_index(tmp_path):
+    """
+    Test that index is rebuilt when the book is reloaded by another process.
+    """
+    file_path = tmp_path / "recipes.json"
+    write_recipes(file_path)
+
+    assert not await refresh_recipe_index()
+
+    db_reload(file_path)
+
+    assert await refresh_recipe_index()
+    assert list(get_recipe_index().recipe_names) == ["Салат «Русский»", "Омлет"]
+    assert not await refresh_recipe_index()
+
+    # Db file replaced by one created anew from the same book is noticed as well
+    db_path = tmp_path / "recipes.db"
+    db_fill(db_path=db_path)
+    drop_recipe_index(db_path)
+    shutil.copyfile(db_path, DB_PATH)
+
+    assert await refresh_recipe_index()
+    assert not await refresh_recipe_index()
+
+
+def test_file_watch(tmp_path):
+    """
+    Test that changes of file are noticed once.
+    """
+    file_path = tmp_path / "recipes.json"
+
+    file_watch = FileWatch(file_path)
+    assert not file_watch.changed()
+
+    write_recipes(file_path)
+    assert file_watch.changed()
+    assert not file_watch.changed()
+
+    file_path.unlink()
+    assert file_watch.changed()
@@ -0,0 +1,74 @@
+import pytest
+
+from src.db import db_fill
+from src.index import RecipeIndex
+from src.snapshot import (
+    write_snapshot,
+    read_snapshot,
+    read_snapshot_version,
+    load_recipe_index,
+    get_snapshot_path,
+)
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = RecipeIndex(
+        [
+            ("first", [{"item": "a", "q": 2}, {"item": "b", "q": 1}]),
+            ("second", [{"item": "b", "q": 4}]),
+            ("третий", [{"item": "a", "q": 1}, {"item": "с", "q": 1}]),
+        ],
+        version=7,
+    )
+    snapshot_path = tmp_path / "index.snapshot"
+
+    write_snapshot(index, snapshot_path)
+    mapped_index = read_snapshot(snapshot_path)
+
+    fridge_components = {"a": 3, "b": 2, "с": 1}
+
+    assert mapped_index.version == 7
+    assert list(mapped_index.components) == list(index.components)
+    assert "с" in mapped_index.components
+    assert mapped_index.get_recipes(
+        mapped_index.match(fridge_components)
+    ) == index.get_recipes(index.match(fridge_components))
+    assert mapped_index.match_partial({"a": 3}) == index.match_partial({"a": 3})
+    assert mapped_index.get_recipes(
+        mapped_index.matrix.match(fridge_components, floor=True)
+    ) == index.get_recipes(index.match(fridge_components, floor=True))
+
+
+def test_snapshot_invalid_file(tmp_path):
+    snapshot_path = tmp_path / "index.snapshot"
+    snapshot_path.write_bytes(b"not a snapshot")
+
+    with pytest.raises(ValueError):
+        read_snapshot(snapshot_path)
+
+    write_snapshot(RecipeIndex([("first", [{"item": "a", "q": 2}])]), snapshot_path)
+    snapshot_path.write_bytes(snapshot_path.read_bytes()[:-8])
+
+    with pytest.raises(ValueError):
+        read_snapshot(snapshot_path)
+
+
+def test_snapshot_follows_book_version():
+    index = load_recipe_index()
+
+    assert get_snapshot_path().is_file()
+    assert load_recipe_index().version == index.version
+    assert list(index.recipe_names) == RecipeIndex.from_db().recipe_names
+
+    # Db created anew from the same book next to the snapshot of the old one
+    old_snapshot = get_snapshot_path().read_bytes()
+
+    db_fill(force_recreate=True)
+
+    assert not get_snapshot_path().is_file()
+
+    get_snapshot_path().write_bytes(old_snapshot)
+    new_index = load_recipe_index()
+
+    assert new_index.version != index.version
+    assert read_snapshot_version(get_snapshot_path()) == new_index.version
@@ -0,0 +1,114 @@
+import asyncio
+
+from src.db import get_query_results
+from src.recipes import (
+    get_recipes_from_components,
+    get_most_popular_components,
+    get_last_recommended_recipes,
+)
+from src.stats import start_write_behind, stop_write_behind, write_stats
+
+
+async def test_write_behind_buffers_stats():
+    fridge_components = {
+        "мясо": 200,
+        "огурец": 1,
+        "картофель": 10,
+    }
+
+    buffer = start_write_behind(flush_interval=3600)
+
+    try:
+        await get_recipes_from_components(fridge_components)
+        await get_recipes_from_components({"огурец": 1})
+
+        components = await get_query_results(
+            "SELECT * FROM components WHERE total_encountered > 0"
+        )
+        popular_components = await get_most_popular_components(number_of_products=3)
+        recommended_recipes = await get_last_recommended_recipes()
+
+        assert len(buffer) == 5
+    finally:
+        await stop_write_behind()
+
+    assert components == []
+    assert popular_components == {
+        "most_popular_components": [{"огурец": 2}, {"мясо": 1}, {"картофель": 1}]
+    }
+    assert recommended_recipes == {
+        "last_recommended_recipes": ["Салат «Ленинградский»", "Салат «Русский»"]
+    }
+
+    assert popular_components == await get_most_popular_components(3)
+    assert recommended_recipes == await get_last_recommended_recipes()
+
+
+async def test_write_behind_flushes_when_full():
+    buffer = start_write_behind(flush_interval=3600, flush_size=2)
+
+    try:
+        await get_recipes_from_components({"огурец": 1, "мясо": 1})
+
+        # Buffer is over its size, so the background task flushes it right away
+        for _ in range(100):
+            if not len(buffer):
+                break
+            await asyncio.sleep(0.01)
+
+        assert len(buffer) == 0
+    finally:
+        await stop_write_behind()
+
+    components = await get_query_results(
+        "SELECT component FROM components WHERE total_encountered = 1"
+    )
+
+    assert sorted(components) == [("мясо",), ("огурец",)]
+
+
+async def test_write_behind_stop_during_flush(monkeypatch):
+    writing = asyncio.Event()
+
+    async def slow_write_stats(*args):
+        writing.set()
+        await asyncio.sleep(0.1)
+        await write_stats(*args)
+
+    monkeypatch.setattr("src.stats.write_stats", slow_write_stats)
+
+    buffer = start_write_behind(flush_interval=3600, flush_size=2)
+
+    try:
+        await get_recipes_from_components({"огурец": 1, "мясо": 1})
+
+        await asyncio.wait_for(writing.wait(), 1)
+    finally:
+        # Batch that is being written is not lost
+        await stop_write_behind()
+
+    components = await get_query_results(
+        "SELECT component FROM components WHERE total_encountered = 1"
+    )
+
+    assert sorted(components) == [("мясо",), ("огурец",)]
+    assert len(buffer) == 0
+
+
+async def test_write_behind_popular_components_outside_db_top():
+    await get_recipes_from_components({"мясо": 1})
+    await get_recipes_from_components({"огурец": 1})
+
+    start_write_behind(flush_interval=3600)
+
+    try:
+        await get_recipes_from_components({"яйцо": 1})
+        await get_recipes_from_components({"яйцо": 1})
+
+        popular_components = await get_most_popular_components(number_of_products=2)
+    finally:
+        await stop_write_behind()
+
+    assert popular_components == {
+        "most_popular_components": [{"яйцо": 2}, {"огурец": 1}]
+    }
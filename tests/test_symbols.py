@@ -0,0 +1,23 @@
+import pickle
+
+from src.symbols import Recipe, SymbolTable
+
+
+def test_symbol_table():
+    symbols = SymbolTable(["мясо", "огурец"])
+
+    assert symbols.add("огурец") == 1
+    assert symbols.add("картофель") == 2
+    assert symbols.get_id("картофель") == 2
+    assert symbols.get_id("рыба") is None
+    assert symbols.get_name(0) == "мясо"
+    assert "мясо" in symbols and "рыба" not in symbols
+    assert list(symbols) == ["мясо", "огурец", "картофель"]
+    assert len(symbols) == 3
+
+
+def test_recipe_pickle():
+    recipe = Recipe(1, 0.5)
+
+    assert pickle.loads(pickle.dumps(recipe)) == recipe
+    assert recipe != Recipe(1, 1.0)
@@ -0,0 +1,39 @@
+import os
+import signal
+import time
+
+from src.workers import Supervisor, create_listening_socket
+
+
+def sleep_forever():
+    time.sleep(60)
+
+
+def test_create_listening_socket():
+    sock = create_listening_socket("127.0.0.1", 0)
+
+    try:
+        assert sock.getsockname()[1] > 0
+        assert sock.get_inheritable()
+    finally:
+        sock.close()
+
+
+def test_supervisor_restarts_dead_workers():
+    supervisor = Supervisor(sleep_forever, workers=2)
+    supervisor.start()
+
+    try:
+        pid = supervisor.processes[0].pid
+
+        os.kill(pid, signal.SIGKILL)
+        supervisor.processes[0].join()
+
+        assert supervisor.check() == 1
+        assert supervisor.processes[0].pid != pid
+        assert all(x.is_alive() for x in supervisor.processes.values())
+    finally:
+        supervisor.stop(timeout=5)
+
+    assert not any(x.is_alive() for x in supervisor.processes.values())
+    assert supervisor.check() == 0